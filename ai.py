@@ -1,11 +1,32 @@
 import os
 import re
 import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import uuid
+import socket
+import signal
+import pstats
+import cProfile
 import subprocess
+import tracemalloc
 import webbrowser
 import configparser
-from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor
+import urllib.parse
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict, field, fields
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 # ==========================
 # Autoinstall Packages
@@ -86,24 +107,359 @@ def hms_to_sec(hms: str) -> int:
     h = parts.pop() if parts else 0
     return h * 3600 + m * 60 + s
 
-def find_highlight(audio_file: str, clip_duration: int = 30, num_clips: int = 1) -> list[tuple[str, str]]:
-    y, sr = librosa.load(audio_file, sr=22050, mono=True)
-    rms = librosa.feature.rms(y=y, frame_length=sr, hop_length=sr, center=False)[0]
+@dataclass
+class HighlightMoment:
+    """Một khoảnh khắc: cửa sổ dài nhất và vị trí bắt đầu (giây) của clip cho từng thời lượng, lồng trong cửa sổ đó."""
+    start: int
+    duration: int
+    score: float
+    clips: dict[int, int]
+
+def load_audio(audio_file: str, sr: int = 22050):
+    y, sr = librosa.load(audio_file, sr=sr, mono=True)
+    return y, sr
+
+def rms_envelope(y, sr: int):
+    """Năng lượng RMS theo từng giây (1 giá trị / giây)."""
+    return librosa.feature.rms(y=y, frame_length=sr, hop_length=sr, center=False)[0]
+
+def _ffmpeg_pipe(src: str, ffmpeg_bin: str, headers: dict | None, out_args: list[str], chunk_bytes: int,
+                 on_data, on_start=None):
+    """Chạy ffmpeg giải mã src ra pipe và gọi on_data(bytes) cho từng khối chunk_bytes (khối cuối có thể ngắn hơn).
+
+    Nguồn HTTP được đọc với tự kết nối lại và headers (cookie, user-agent) của yt-dlp. ffmpeg bị dừng nếu on_data
+    lỗi; exit code khác 0 thì raise kèm stderr. on_start(proc) được gọi ngay khi ffmpeg khởi động.
+    """
+    cmd = [ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-nostdin"]
+    if src.startswith(("http://", "https://")):
+        cmd.extend(["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"])
+        if headers:
+            cmd.extend(["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())])
+    cmd.extend(["-i", src, *out_args, "pipe:1"])
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if on_start is not None:
+        on_start(proc)
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            on_data(data)
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode('utf-8', errors='replace')
+        proc.stderr.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise Exception(f"FFmpeg process failed with exit code {proc.returncode}\n{stderr}")
+
+def motion_envelope(src: str, ffmpeg_bin: str, fps: int = 4, width: int = 160, height: int = 90,
+                    chunk_seconds: int = 60, headers: dict | None = None, on_start=None):
+    """Năng lượng chuyển động theo từng giây.
+
+    ffmpeg giải mã luồng xám đã thu nhỏ (width x height, fps khung/giây) qua pipe; NumPy tính trung bình
+    |khung(t) - khung(t-1)| theo từng chunk, chỉ giữ lại khung cuối giữa các chunk nên bộ nhớ không phụ thuộc độ dài video.
+    on_start(proc) được gọi ngay khi ffmpeg khởi động, để luồng khác có thể dừng tiến trình (hủy job).
+    """
+    frame_size = width * height
+    energies = []
+    prev = None
+
+    def on_data(data: bytes):
+        nonlocal prev
+        frames = np.frombuffer(data[:len(data) - len(data) % frame_size], dtype=np.uint8)
+        frames = frames.reshape(-1, frame_size).astype(np.int16)
+        if prev is None:
+            energies.append(np.zeros(1, dtype=np.float32))
+            diffs = np.abs(np.diff(frames, axis=0))
+        else:
+            diffs = np.abs(np.diff(np.vstack((prev, frames)), axis=0))
+        energies.append(diffs.mean(axis=1, dtype=np.float32))
+        prev = frames[-1:]
+
+    _ffmpeg_pipe(src, ffmpeg_bin, headers, [
+        "-an", "-sn", "-dn",
+        "-vf", f"fps={fps},scale={width}:{height}:flags=fast_bilinear,format=gray",
+        "-f", "rawvideo", "-pix_fmt", "gray",
+    ], frame_size * fps * chunk_seconds, on_data, on_start)
+    if not energies:
+        return np.zeros(0, dtype=np.float32)
+    per_frame = np.concatenate(energies)
+    seconds = int(np.ceil(per_frame.size / fps))
+    per_frame = np.pad(per_frame, (0, seconds * fps - per_frame.size))
+    return per_frame.reshape(seconds, fps).mean(axis=1)
+
+# Chỉ định dạng video: clip luôn cần luồng hình
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.m4v', '.avi', '.flv', '.ts')
+
+def is_direct_source(src: str) -> bool:
+    """File cục bộ hoặc URL HTTP(S) trỏ thẳng tới file media: không cần qua yt-dlp."""
+    if os.path.isfile(src):
+        return True
+    parsed = urllib.parse.urlparse(src)
+    return parsed.scheme in ('http', 'https') and parsed.path.lower().endswith(MEDIA_EXTENSIONS)
+
+def direct_source_title(src: str) -> str:
+    if os.path.isfile(src):
+        name = os.path.basename(src)
+    else:
+        name = os.path.basename(urllib.parse.unquote(urllib.parse.urlparse(src).path))
+    return safe_filename(os.path.splitext(name)[0])
+
+class IncrementalEnvelope:
+    """RMS theo từng giây, cập nhật dần theo các chunk audio (khớp với rms_envelope, center=False)."""
+
+    def __init__(self, sr: int = 22050):
+        self.sr = sr
+        self.seconds = 0
+        self._parts = []
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._cache = None
+
+    def feed(self, samples):
+        if self._tail.size:
+            samples = np.concatenate((self._tail, samples))
+        full = (samples.size // self.sr) * self.sr
+        if full:
+            frames = samples[:full].reshape(-1, self.sr)
+            self._parts.append(np.sqrt(np.mean(frames * frames, axis=1)))
+            self.seconds += frames.shape[0]
+            self._cache = None
+        self._tail = samples[full:].copy()
+
+    @property
+    def envelope(self):
+        if self._cache is None:
+            self._cache = np.concatenate(self._parts) if self._parts else np.zeros(0, dtype=np.float32)
+            self._parts = [self._cache] if self._parts else []
+        return self._cache
+
+    def candidates(self, durations, num_clips: int) -> list[HighlightMoment]:
+        """Top-k tạm thời trên phần audio đã giải mã."""
+        return plan_highlights(self.envelope, durations, num_clips)
+
+def ffmpeg_audio_envelope(src: str, ffmpeg_bin: str, sr: int = 22050, chunk_seconds: int = 60,
+                          headers: dict | None = None, on_chunk=None, on_start=None):
+    """Giải mã audio bằng ffmpeg (pipe) và tính RMS theo từng giây, bộ nhớ giới hạn theo chunk.
+
+    Với nguồn HTTP, ffmpeg đọc dần theo luồng nên việc tải và phân tích diễn ra đồng thời;
+    on_chunk(envelope: IncrementalEnvelope) được gọi sau mỗi chunk, on_start(proc) ngay khi ffmpeg khởi động.
+    """
+    env = IncrementalEnvelope(sr)
+
+    def on_data(data: bytes):
+        env.feed(np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32))
+        if on_chunk is not None:
+            on_chunk(env)
+
+    _ffmpeg_pipe(src, ffmpeg_bin, headers, [
+        "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(sr),
+        "-f", "f32le",
+    ], sr * chunk_seconds * 4, on_data, on_start)
+    return env.envelope
+
+def heatmap_envelope(heatmap: list[dict] | None, duration: float | None = None):
+    """Chuyển heatmap "Most replayed" của YouTube (start_time/end_time/value) thành giá trị theo từng giây."""
+    if not heatmap:
+        return None
+    starts = np.array([h.get("start_time", 0) for h in heatmap], dtype=np.float64)
+    ends = np.array([h.get("end_time", 0) for h in heatmap], dtype=np.float64)
+    values = np.array([h.get("value", 0) for h in heatmap], dtype=np.float32)
+    order = np.argsort(starts)
+    starts, ends, values = starts[order], ends[order], values[order]
+    n = int(np.ceil(max(duration or 0, ends.max())))
+    if n <= 0:
+        return None
+    t = np.arange(n) + 0.5
+    idx = np.clip(np.searchsorted(starts, t, side="right") - 1, 0, len(starts) - 1)
+    env = values[idx]
+    env[t >= ends[idx]] = 0
+    return env
+
+SUBTITLE_EXTENSIONS = ('.vtt', '.srt')
+_SUB_TIME_RE = re.compile(
+    r'((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})')
+_SUB_TAG_RE = re.compile(r'<[^>]+>|\{[^}]+\}')
+
+def _sub_time_to_sec(ts: str) -> float:
+    hms, ms = re.split(r'[.,]', ts)
+    return hms_to_sec(hms) + int(ms) / 1000.0
+
+def parse_subtitles(text: str) -> list[tuple[float, float, str]]:
+    """Đọc cue từ WebVTT/SRT. Bỏ các dòng lặp lại của phụ đề tự động dạng "cuộn" trên YouTube."""
+    cues = []
+    prev_lines = set()
+    lines = text.replace('\r', '').split('\n')
+    i = 0
+    while i < len(lines):
+        m = _SUB_TIME_RE.search(lines[i])
+        i += 1
+        if not m:
+            continue
+        body = []
+        while i < len(lines) and lines[i].strip():
+            body.append(_SUB_TAG_RE.sub('', lines[i]).strip())
+            i += 1
+        body = [b for b in body if b]
+        new_lines = [b for b in body if b not in prev_lines]
+        prev_lines = set(body)
+        if new_lines:
+            cues.append((_sub_time_to_sec(m.group(1)), _sub_time_to_sec(m.group(2)), " ".join(new_lines)))
+    return cues
+
+def caption_envelope(cues: list[tuple[float, float, str]], duration: float | None = None,
+                     keywords: tuple[str, ...] = (), keyword_weight: float = 5.0):
+    """Mật độ lời thoại (từ/giây) + mật độ từ khóa theo từng giây, tính bằng mảng hiệu (diff array)."""
+    if not cues:
+        return None
+    starts = np.array([c[0] for c in cues], dtype=np.float64)
+    ends = np.array([c[1] for c in cues], dtype=np.float64)
+    n = int(np.ceil(max(duration or 0, ends.max())))
+    if n <= 0:
+        return None
+    texts = [c[2].lower() for c in cues]
+    words = np.array([len(t.split()) for t in texts], dtype=np.float32)
+    score = words
+    kw = [k.strip().lower() for k in keywords if k.strip()]
+    if kw:
+        kw_re = re.compile("|".join(re.escape(k) for k in kw))
+        hits = np.array([len(kw_re.findall(t)) for t in texts], dtype=np.float32)
+        score = score + keyword_weight * hits
+
+    s_idx = np.clip(np.floor(starts).astype(np.int64), 0, n - 1)
+    e_idx = np.clip(np.ceil(ends).astype(np.int64), s_idx + 1, n)
+    rate = score / (e_idx - s_idx)
+    diff = np.zeros(n + 1, dtype=np.float32)
+    np.add.at(diff, s_idx, rate)
+    np.add.at(diff, e_idx, -rate)
+    return np.cumsum(diff[:n])
+
+def find_sidecar_subtitles(src: str) -> str | None:
+    """Tìm file phụ đề cạnh file video cục bộ (video.vtt, video.srt, video.vi.vtt...)."""
+    if not os.path.isfile(src):
+        return None
+    base, _ = os.path.splitext(src)
+    folder = os.path.dirname(src) or "."
+    stem = os.path.basename(base)
+    for ext in SUBTITLE_EXTENSIONS:
+        if os.path.isfile(base + ext):
+            return base + ext
+    for f in sorted(os.listdir(folder)):
+        if f.startswith(stem + ".") and f.lower().endswith(SUBTITLE_EXTENSIONS):
+            return os.path.join(folder, f)
+    return None
 
-    highlight_points = []
+def combine_signals(signals: dict) -> np.ndarray:
+    """Kết hợp các tín hiệu theo giây (chuẩn hóa theo max rồi lấy trung bình)."""
+    arrays = [np.asarray(v, dtype=np.float32) for v in signals.values() if v is not None and len(v)]
+    if not arrays:
+        return np.zeros(0, dtype=np.float32)
+    if len(arrays) == 1:
+        return arrays[0]
+    n = max(len(a) for a in arrays)
+    combined = np.zeros(n, dtype=np.float32)
+    for a in arrays:
+        peak = float(a.max())
+        if peak > 0:
+            combined[:len(a)] += a / peak
+    return combined / len(arrays)
+
+PLAN_CENTRE_WEIGHT = 0.05
+
+def plan_highlights(envelope, durations, num_clips: int = 1) -> list[HighlightMoment]:
+    """Lập kế hoạch highlight cho nhiều thời lượng từ một envelope.
+
+    Tổng năng lượng theo cửa sổ của mọi thời lượng được tính trong một lượt vector hóa (cumsum + chỉ số 2 chiều).
+    Khoảnh khắc được chọn tham lam theo thời lượng dài nhất (không chồng lấn); clip ngắn hơn được đặt
+    tại cửa sổ tốt nhất nằm bên trong clip dài. Khi chọn cửa sổ, tổng năng lượng bị trừ nhẹ theo độ phân tán
+    của năng lượng quanh tâm cửa sổ (PLAN_CENTRE_WEIGHT), nên một đỉnh ngắn nằm giữa clip thay vì ở giây cuối.
+    """
+    env = np.asarray(envelope, dtype=np.float64)
+    n = env.size
+    durs = sorted({int(d) for d in durations if int(d) > 0}, reverse=True)
+    if n == 0 or not durs:
+        return []
+
+    eff = np.minimum(np.array(durs), n)
+    t = np.arange(n, dtype=np.float64)
+    starts = np.arange(n)
+    ends = np.minimum(starts[None, :] + eff[:, None], n)
+    valid = starts[None, :] + eff[:, None] <= n
+
+    def window(x):
+        cs = np.concatenate(([0.0], np.cumsum(x)))
+        return cs[ends] - cs[starts][None, :]
+
+    raw = window(env)
+    sums = np.where(valid, raw, -np.inf)
+    # Mô-men bậc hai quanh tâm cửa sổ, chuẩn hóa về [0, 1]: 0 khi năng lượng dồn ở giữa, 1 khi ở hai mép
+    centre = starts[None, :] + (eff[:, None] - 1) / 2
+    m2 = window(env * t * t) - 2 * centre * window(env * t) + centre * centre * raw
+    half = np.maximum(eff[:, None] / 2, 1)
+    spread = np.clip(np.divide(m2, raw * half * half, out=np.zeros_like(raw), where=raw > 0), 0, 1)
+    scores = np.where(valid, raw * (1 - PLAN_CENTRE_WEIGHT * spread), -np.inf)
+
+    longest = scores[0].copy()
+    span = int(eff[0])
+    moments = []
     for _ in range(num_clips):
-        best_sec = int(np.argmax(rms))
-        if rms[best_sec] == 0:
+        s = int(np.argmax(longest))
+        # Mọi cửa sổ còn lại đều chồng lấn khoảnh khắc đã chọn (-inf): dừng, không lấy lại cửa sổ 0
+        if not np.isfinite(longest[s]):
+            break
+        score = float(sums[0, s])
+        if score <= 0:
             break
-        start = max(0, best_sec - clip_duration // 2)
-        end = start + clip_duration
-        highlight_points.append((sec_to_time(start), sec_to_time(end)))
-        start_idx = max(0, best_sec - clip_duration)
-        end_idx = min(len(rms), best_sec + clip_duration)
-        rms[start_idx:end_idx] = 0
-    return highlight_points
-
-def save_config(ffmpeg_path: str, cookies_path: str, output_path: str, quality: str, num_clips: int, aspect_ratio: str):
+        clips = {durs[0]: s}
+        for k in range(1, len(durs)):
+            sub = scores[k, s:s + span - int(eff[k]) + 1]
+            clips[durs[k]] = s + int(np.argmax(sub))
+        moments.append(HighlightMoment(start=s, duration=durs[0], score=score, clips=clips))
+        longest[max(0, s - span + 1):s + span] = -np.inf
+    return moments
+
+def estimate_loudness(rms, start: int, duration: int) -> float | None:
+    """Ước lượng độ lớn (xấp xỉ LUFS) của một đoạn từ RMS theo giây đã có khi phân tích.
+
+    Có cổng tuyệt đối -70 dB và cổng tương đối -10 dB như BS.1770, nhưng không lọc K-weighting
+    nên chỉ là giá trị gần đúng, đủ để tính mức khuếch đại.
+    """
+    seg = np.asarray(rms[start:start + duration], dtype=np.float64)
+    seg = seg[seg > 0]
+    if seg.size == 0:
+        return None
+    db = 20 * np.log10(seg)
+    seg = seg[db > -70]
+    if seg.size == 0:
+        return None
+    gate = 10 * np.log10(np.mean(seg * seg)) - 10
+    seg = seg[20 * np.log10(seg) > gate]
+    # Audio phân tích là mono; khi phát stereo 2 kênh giống nhau, độ lớn tăng ~3 dB
+    return float(10 * np.log10(np.mean(seg * seg)) + 3.01 - 0.691)
+
+def find_highlight(audio_file: str, clip_duration: int = 30, num_clips: int = 1) -> list[tuple[str, str]]:
+    y, sr = load_audio(audio_file)
+    moments = plan_highlights(rms_envelope(y, sr), (clip_duration,), num_clips)
+    return [(sec_to_time(m.start), sec_to_time(m.start + m.duration)) for m in moments]
+
+ASPECT_RATIOS = ("Gốc", "Dọc 9:16 (Cắt)", "Dọc 9:16 (Viền đen)")
+ASPECT_SUFFIXES = {"Gốc": "", "Dọc 9:16 (Cắt)": "_916_crop", "Dọc 9:16 (Viền đen)": "_916_pad"}
+
+def aspect_filter(aspect_ratio: str, w_orig: int, h_orig: int) -> str:
+    if aspect_ratio == "Dọc 9:16 (Cắt)":
+        new_w = int(h_orig * 9 / 16)
+        return f"crop={new_w}:{h_orig}"
+    if aspect_ratio == "Dọc 9:16 (Viền đen)":
+        new_h = int(w_orig * 16 / 9)
+        pad_y = (new_h - h_orig) // 2
+        return f"pad=width={w_orig}:height={new_h}:x=0:y={pad_y}:color=black"
+    return "null"
+
+def save_config(ffmpeg_path: str, cookies_path: str, output_path: str, quality: str, num_clips: int, aspect_ratios: tuple[str, ...]):
     config = configparser.ConfigParser()
     config['PATHS'] = {
         'ffmpeg_path': ffmpeg_path,
@@ -113,12 +469,12 @@ def save_config(ffmpeg_path: str, cookies_path: str, output_path: str, quality:
     config['SETTINGS'] = {
         'quality': quality,
         'num_clips': str(num_clips),
-        'aspect_ratio': aspect_ratio,
+        'aspect_ratio': '|'.join(aspect_ratios),
     }
     with open('config.ini', 'w', encoding='utf-8') as f:
         config.write(f)
 
-def load_config() -> tuple[str, str, str, str, int, str]:
+def load_config() -> tuple[str, str, str, str, int, tuple[str, ...]]:
     config = configparser.ConfigParser()
     if os.path.exists('config.ini'):
         config.read('config.ini', encoding='utf-8')
@@ -127,9 +483,9 @@ def load_config() -> tuple[str, str, str, str, int, str]:
         output_path = config.get('SETTINGS', 'output_path', fallback=os.path.join(os.getcwd(), 'highlights'))
         quality = config.get('SETTINGS', 'quality', fallback='1080p')
         num_clips = config.getint('SETTINGS', 'num_clips', fallback=1)
-        aspect_ratio = config.get('SETTINGS', 'aspect_ratio', fallback='Gốc')
-        return ffmpeg_path, cookies_path, output_path, quality, num_clips, aspect_ratio
-    return '', '', os.path.join(os.getcwd(), 'highlights'), '1080p', 1, 'Gốc'
+        aspect_ratios = tuple(a for a in config.get('SETTINGS', 'aspect_ratio', fallback='Gốc').split('|') if a in ASPECT_RATIOS)
+        return ffmpeg_path, cookies_path, output_path, quality, num_clips, aspect_ratios or ('Gốc',)
+    return '', '', os.path.join(os.getcwd(), 'highlights'), '1080p', 1, ('Gốc',)
 
 def find_ffmpeg_in_path() -> str | None:
     path_env = os.environ.get('PATH', '')
@@ -160,19 +516,371 @@ def get_video_duration(file_path: str, ffprobe_bin: str) -> float:
     except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
         return 0
 
+THUMBNAIL_HEIGHT = 320
+
+def thumbnail_path(video_path: str) -> str:
+    return os.path.join(os.path.dirname(video_path), "thumbs", os.path.basename(video_path) + ".png")
+
+def clip_info_path(video_path: str) -> str:
+    return os.path.join(os.path.dirname(video_path), "thumbs", os.path.basename(video_path) + ".json")
+
+def write_clip_info(video_path: str, **info):
+    """Ghi thông tin clip (thời lượng...) cạnh thumbnail để thư viện không phải gọi ffprobe."""
+    with open(clip_info_path(video_path), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+def read_clip_info(video_path: str) -> dict:
+    try:
+        with open(clip_info_path(video_path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# ==========================
+# Process-pool analysis
+# ==========================
+ANALYSIS_CANCELLED = -1
+
+def analyze_source(src: str, ffmpeg_bin: str, headers: dict | None = None, sr: int = 22050,
+                   pids=None, token: str | None = None):
+    """Chạy trong tiến trình con: giải mã + tính envelope, chỉ trả về envelope gọn (float32, 1 giá trị/giây).
+
+    pids (dict dùng chung qua Manager) nhận PID của ffmpeg theo token để tiến trình cha có thể dừng nó khi hủy job.
+    """
+    def on_start(proc):
+        if pids is None:
+            return
+        if pids.get(token) == ANALYSIS_CANCELLED:
+            proc.kill()
+        else:
+            pids[token] = proc.pid
+
+    try:
+        return np.asarray(ffmpeg_audio_envelope(src, ffmpeg_bin, sr, headers=headers, on_start=on_start), dtype=np.float32)
+    finally:
+        if pids is not None and pids.get(token) != ANALYSIS_CANCELLED:
+            pids.pop(token, None)
+
+class AnalysisPool:
+    """Pool tiến trình để giải mã và trích đặc trưng cho nhiều nguồn song song, ngoài GIL của tiến trình GUI."""
+
+    def __init__(self, workers: int = 2):
+        self.workers = max(1, workers)
+        self._executor = None
+        self._manager = None
+        self._pids = None
+
+    def _ensure(self):
+        if self._executor is None:
+            # spawn: không fork tiến trình đang chạy Qt/thread
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            self._manager = ctx.Manager()
+            self._pids = self._manager.dict()
+        return self._executor
+
+    def submit(self, src: str, ffmpeg_bin: str, headers: dict | None = None, token: str | None = None):
+        executor = self._ensure()
+        return executor.submit(analyze_source, src, ffmpeg_bin, headers, 22050, self._pids if token else None, token)
+
+    def cancel(self, future, token: str):
+        """Hủy một phân tích đã gửi: bỏ khỏi hàng đợi, hoặc dừng ffmpeg trong tiến trình con để giải phóng slot."""
+        if future.cancel() or self._pids is None:
+            return
+        pid = self._pids.get(token)
+        self._pids[token] = ANALYSIS_CANCELLED
+        if pid and pid > 0:
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+
+    def submit_motion(self, src: str, ffmpeg_bin: str, headers: dict | None = None):
+        return self._ensure().submit(motion_envelope, src, ffmpeg_bin, headers=headers)
+
+    def shutdown(self, cancel: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+            self._pids = None
+
+# ==========================
+# Profiling
+# ==========================
+def _children_cpu_time() -> float | None:
+    """Thời gian CPU của các tiến trình con (ffmpeg, ffprobe...) đã kết thúc."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+# tracemalloc là trạng thái chung của cả tiến trình: đếm số profiler đang dùng (tắt khi profiler cuối cùng dừng)
+# và các giai đoạn đang đo, vì bộ nhớ đỉnh chỉ đúng khi không có giai đoạn nào khác chạy song song.
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+_active_stages = {}  # id giai đoạn -> đã bị chồng lấn bởi giai đoạn khác
+
+class JobProfiler:
+    """Đo thời gian thực, thời gian CPU và bộ nhớ đỉnh cho từng giai đoạn của một job."""
+
+    def __init__(self, enabled: bool = False, python_profile: bool = False):
+        self.enabled = enabled
+        self.stages = []
+        self._profiler = cProfile.Profile() if (enabled and python_profile) else None
+        self._uses_tracemalloc = False
+        self._t0 = time.perf_counter()
+
+    def start(self):
+        global _tracemalloc_users, _tracemalloc_started
+        if self.enabled and not self._uses_tracemalloc:
+            with _tracemalloc_lock:
+                if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_started = True
+                _tracemalloc_users += 1
+            self._uses_tracemalloc = True
+        self._t0 = time.perf_counter()
+
+    def stop(self):
+        global _tracemalloc_users, _tracemalloc_started
+        if self._uses_tracemalloc:
+            with _tracemalloc_lock:
+                _tracemalloc_users -= 1
+                if _tracemalloc_users == 0 and _tracemalloc_started:
+                    tracemalloc.stop()
+                    _tracemalloc_started = False
+            self._uses_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        stage_id = object()
+        with _tracemalloc_lock:
+            overlapped = bool(_active_stages)
+            for other in _active_stages:
+                _active_stages[other] = True
+            _active_stages[stage_id] = overlapped
+            if not overlapped and tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+        children0 = _children_cpu_time()
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        if self._profiler:
+            self._profiler.enable()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            if self._profiler:
+                self._profiler.disable()
+            entry = {
+                "stage": name,
+                "ok": ok,
+                "wall_s": round(time.perf_counter() - wall0, 4),
+                "cpu_s": round(time.thread_time() - cpu0, 4),
+            }
+            children1 = _children_cpu_time()
+            if children0 is not None and children1 is not None:
+                entry["children_cpu_s"] = round(children1 - children0, 4)
+            with _tracemalloc_lock:
+                overlapped = _active_stages.pop(stage_id)
+                if tracemalloc.is_tracing() and not overlapped:
+                    entry["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            if overlapped:
+                # Giai đoạn của job khác chạy song song: bộ nhớ đỉnh không tách riêng được
+                entry["py_peak_shared"] = True
+            self.stages.append(entry)
+
+    def write_report(self, report_path: str, **meta):
+        if not self.enabled:
+            return None
+        report = dict(meta)
+        report["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        report["total_wall_s"] = round(time.perf_counter() - self._t0, 4)
+        report["stages"] = self.stages
+        if resource is not None:
+            # ru_maxrss: KB trên Linux, byte trên macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            report["peak_rss_mb"] = round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+        if self._profiler:
+            prof_path = os.path.splitext(report_path)[0] + ".prof"
+            self._profiler.dump_stats(prof_path)
+            stats = pstats.Stats(self._profiler)
+            stats.sort_stats("cumulative")
+            top = []
+            for (filename, lineno, func), (cc, nc, tt, ct, _) in stats.stats.items():
+                top.append({
+                    "function": f"{os.path.basename(filename)}:{lineno}({func})",
+                    "calls": nc,
+                    "tottime_s": round(tt, 4),
+                    "cumtime_s": round(ct, 4),
+                })
+            top.sort(key=lambda x: x["cumtime_s"], reverse=True)
+            report["python_profile"] = {"prof_file": prof_path, "top_cumulative": top[:30]}
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report_path
+
+# ==========================
+# Job manifest (checkpoint / resume)
+# ==========================
+class JobManifest:
+    """Manifest JSON của một job: các giai đoạn đã xong, kế hoạch highlight, file tạm và trạng thái từng clip.
+
+    Được lưu trong {output_path}/.jobs/{job_id}.json sau mỗi giai đoạn (ghi nguyên tử) và bị xóa khi job hoàn tất.
+    """
+
+    def __init__(self, path: str, data: dict):
+        self.path = path
+        self.data = data
+
+    @staticmethod
+    def job_id(cfg) -> str:
+        key = {
+            "url": cfg.url,
+            "clip_durations": list(cfg.clip_durations),
+            "num_clips": cfg.num_clips,
+            "aspect_ratios": list(cfg.aspect_ratios),
+            "quality": cfg.quality,
+            "highlight_signals": list(cfg.highlight_signals),
+            "caption_keywords": list(cfg.caption_keywords),
+            "loudness_target": cfg.loudness_target,
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def open(cls, cfg, resume: bool = True) -> "JobManifest":
+        job_id = cls.job_id(cfg)
+        path = os.path.join(cfg.output_path, ".jobs", f"{job_id}.json")
+        data = None
+        if resume and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+        if data is None:
+            data = {"job_id": job_id, "url": cfg.url, "stages": {}, "clips": {}}
+        return cls(path, data)
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.data["stages"])
+
+    def done(self, stage: str) -> bool:
+        return stage in self.data["stages"]
+
+    def get(self, stage: str) -> dict:
+        return self.data["stages"].get(stage) or {}
+
+    def mark(self, stage: str, **info):
+        self.data["stages"][stage] = info
+        self.save()
+
+    def clip_done(self, dst: str) -> bool:
+        return self.data["clips"].get(dst) == "done"
+
+    def set_clip(self, dst: str, status: str):
+        self.data["clips"][dst] = status
+        self.save()
+
+    def save(self):
+        self.data["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def temp_dir(self) -> str:
+        """Thư mục file tạm riêng của job ({output_path}/.jobs/{job_id}/): các job chạy song song không dùng chung file."""
+        return os.path.splitext(self.path)[0]
+
+    def owns(self, path: str | None) -> bool:
+        """File tạm thuộc về job này (nằm trong temp_dir) và còn tồn tại: an toàn để dùng lại khi tiếp tục."""
+        return bool(path) and os.path.exists(path) and \
+            os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.temp_dir)
+
+    def temp_path(self, name: str) -> str:
+        os.makedirs(self.temp_dir, exist_ok=True)
+        return os.path.join(self.temp_dir, name)
+
+def validate_clip(path: str, expected: float | None, ffprobe_bin: str) -> bool:
+    """Clip đã tồn tại và đọc được, độ dài gần đúng như mong đợi (copy luồng có thể lệch tới một GOP)."""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    duration = get_video_duration(path, ffprobe_bin)
+    if duration <= 0:
+        return False
+    return expected is None or abs(duration - expected) <= max(5.0, 0.2 * expected)
+
 # ==========================
 # Worker (QThread)
 # ==========================
 @dataclass
 class JobConfig:
     url: str
-    clip_duration: int
+    clip_durations: tuple[int, ...]
     ffmpeg_path: str
     cookies_path: str | None
     output_path: str
     quality: str
     num_clips: int
-    aspect_ratio: str
+    aspect_ratios: tuple[str, ...]
+    profile: bool = False
+    profile_python: bool = False
+    streaming_analysis: bool = False
+    highlight_signals: tuple[str, ...] = ("audio",)
+    caption_keywords: tuple[str, ...] = ()
+    loudness_target: float | None = None  # LUFS; None: không chuẩn hóa
+    resume: bool = True
+
+LOUDNESS_TRUE_PEAK = -1.5  # dBTP
+
+@dataclass
+class ClipOutput:
+    """Một file đầu ra trong một lần cắt: tỷ lệ khung hình, vị trí (so với đầu đoạn) và thời lượng."""
+    aspect: str
+    dst: str
+    offset: int = 0
+    duration: int | None = None
+    audio_filter: str | None = None
+
+class JobCancelled(Exception):
+    pass
+
+@dataclass
+class PreparedSource:
+    """Kết quả bước chuẩn bị: nguồn để cắt, đầu vào để phân tích và các file tạm cần dọn."""
+    title: str
+    kind: str  # "direct" | "stream" | "wav" | "none" (không cần audio)
+    source_video: str
+    analysis_src: str | None
+    headers: dict | None = None
+    temp_files: list[str] = field(default_factory=list)
+    signals: dict = field(default_factory=dict)  # tín hiệu đã có sẵn, không cần audio
+    motion_src: str | None = None  # None: tính chuyển động từ video gốc sau khi tải
+    motion_headers: dict | None = None
+    moments: list | None = None  # kế hoạch đã lưu trong manifest (tiếp tục job)
+    audio_filters: list | None = None
 
 class HighlightWorker(QObject):
     log = pyqtSignal(str)
@@ -184,6 +892,42 @@ class HighlightWorker(QObject):
         super().__init__(parent)
         self.cfg = cfg
         self.process = None
+        self.info = None
+        self.title = None
+        self.manifest = None
+        self.analysis_pool = None  # AnalysisPool dùng chung (server); None: phân tích trong luồng này
+        self.outputs = []
+        self._cancelled = False
+
+    def cancel(self):
+        """Yêu cầu dừng job: dừng tiến trình ffmpeg đang chạy và dừng ở điểm kiểm tra kế tiếp."""
+        self._cancelled = True
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def _check_cancelled(self):
+        if self._cancelled:
+            raise JobCancelled("Đã hủy job.")
+
+    def _track_process(self, proc: subprocess.Popen):
+        """Ghi nhận tiến trình ffmpeg đang chạy để cancel() dừng được nó."""
+        self.process = proc
+        if self._cancelled:
+            proc.kill()
+
+    def _wait_future(self, future, token: str):
+        """Chờ kết quả từ AnalysisPool nhưng vẫn dừng được khi job bị hủy (ffmpeg trong tiến trình con bị dừng theo token)."""
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeoutError:
+                if self._cancelled:
+                    self.analysis_pool.cancel(future, token)
+                    raise JobCancelled("Đã hủy job.")
+
+    def _ydl_progress_hook(self, d):
+        self._check_cancelled()
 
     def _resolve_ffmpeg_bin(self):
         path = self.cfg.ffmpeg_path
@@ -203,6 +947,7 @@ class HighlightWorker(QObject):
             'http_headers': headers,
             'nocheckcertificate': True,
             'ffmpeg_location': self._resolve_ffmpeg_bin(),
+            'progress_hooks': [self._ydl_progress_hook],
         }
         if self.cfg.cookies_path and os.path.isfile(self.cfg.cookies_path):
             opts['cookiefile'] = self.cfg.cookies_path
@@ -213,16 +958,84 @@ class HighlightWorker(QObject):
         opts = self._ydl_common()
         with YoutubeDL(opts) as ydl:
             info = ydl.extract_info(self.cfg.url, download=False)
+        self.info = info
         title = info.get("title", "highlight")
         return safe_filename(title)
 
-    def _download_audio_wav(self) -> str:
+    @staticmethod
+    def _stream_request(fmt: dict) -> tuple[str, dict]:
+        """URL và headers HTTP (kèm cookie) để ffmpeg đọc trực tiếp một format của yt-dlp."""
+        headers = dict(fmt.get("http_headers") or {})
+        if fmt.get("cookies"):
+            headers["Cookie"] = fmt["cookies"]
+        return fmt["url"], headers
+
+    def _select_audio_stream(self) -> tuple[str, dict] | None:
+        """Chọn URL luồng audio mà ffmpeg đọc trực tiếp được (https/m3u8) từ info của yt-dlp."""
+        info = self.info or {}
+        candidates = []
+        for f in info.get("formats") or []:
+            if not f.get("url") or f.get("acodec") in (None, "none"):
+                continue
+            if f.get("protocol") not in ("https", "http", "m3u8", "m3u8_native"):
+                continue
+            audio_only = f.get("vcodec") in (None, "none")
+            candidates.append((audio_only, f.get("abr") or f.get("tbr") or 0, f))
+        if not candidates:
+            return None
+        # Ưu tiên audio-only (nhẹ nhất), sau đó bitrate cao nhất
+        _, _, fmt = max(candidates, key=lambda c: (c[0], c[1]))
+        return self._stream_request(fmt)
+
+    def _select_video_stream(self, min_height: int = 144) -> tuple[str, dict] | None:
+        """Chọn luồng video độ phân giải thấp nhất (>= min_height) để phân tích chuyển động, không cần tải video gốc."""
+        info = self.info or {}
+        candidates = []
+        for f in info.get("formats") or []:
+            if not f.get("url") or f.get("vcodec") in (None, "none") or not f.get("height"):
+                continue
+            if f.get("protocol") not in ("https", "http", "m3u8", "m3u8_native"):
+                continue
+            if f["height"] >= min_height:
+                candidates.append(f)
+        if not candidates:
+            return None
+        fmt = min(candidates, key=lambda f: (f["height"], f.get("tbr") or 0))
+        return self._stream_request(fmt)
+
+    def _stream_audio_envelope(self, src: str, headers: dict | None = None):
+        """Phân tích audio trong khi tải: envelope và top-k được cập nhật theo từng chunk."""
+        self.log.emit("Đang tải và phân tích audio theo luồng...")
+        self.progress.emit(10)
+        total = (self.info or {}).get("duration")
+        if not total and headers is None:
+            total = get_video_duration(src, os.path.join(self._resolve_ffmpeg_bin(), "ffprobe.exe"))
+        last_report = [0]
+
+        def on_chunk(env: IncrementalEnvelope):
+            if total:
+                self.progress.emit(10 + int(25 * min(1.0, env.seconds / total)))
+            if env.seconds - last_report[0] >= 300:
+                last_report[0] = env.seconds
+                moments = env.candidates(self.cfg.clip_durations, self.cfg.num_clips)
+                self.log.emit(f"[{sec_to_time(env.seconds)}] Ứng viên tạm thời: " + ", ".join(sec_to_time(m.start) for m in moments))
+
+        ffmpeg_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffmpeg.exe")
+        try:
+            return ffmpeg_audio_envelope(src, ffmpeg_bin, headers=headers, on_chunk=on_chunk, on_start=self._track_process)
+        except Exception:
+            self._check_cancelled()
+            raise
+        finally:
+            self.process = None
+
+    def _download_audio_wav(self, out_base: str = "temp_audio") -> str:
         self.log.emit("Đang tải audio (WAV) để phân tích...")
         self.progress.emit(10)
         opts = self._ydl_common()
         opts.update({
             'format': 'bestaudio/best',
-            'outtmpl': "temp_audio.%(ext)s",
+            'outtmpl': out_base + ".%(ext)s",
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'wav',
@@ -231,7 +1044,7 @@ class HighlightWorker(QObject):
         })
         with YoutubeDL(opts) as ydl:
             ydl.download([self.cfg.url])
-        return "temp_audio.wav"
+        return out_base + ".wav"
 
     def _download_full_video(self, out_path: str):
         self.log.emit("⬇Đang tải video gốc...")
@@ -253,103 +1066,1122 @@ class HighlightWorker(QObject):
         with YoutubeDL(opts) as ydl:
             ydl.download([self.cfg.url])
 
-    def _cut_with_ffmpeg(self, src: str, dst: str, start_hms: str, duration: int):
-        self.log.emit(f"FFmpeg: cắt {start_hms} (dài {duration}s) -> {os.path.basename(dst)}")
+    def _probe_resolution(self, src: str) -> tuple[int, int] | None:
+        ffprobe_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffprobe.exe")
+        get_res_cmd = [
+            ffprobe_bin, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", src
+        ]
+        try:
+            result = subprocess.run(get_res_cmd, capture_output=True, text=True, check=True)
+            w_orig, h_orig = map(int, result.stdout.strip().split('x'))
+            return w_orig, h_orig
+        except (subprocess.CalledProcessError, ValueError):
+            return None
+
+    def _has_video_stream(self, src: str) -> bool:
+        """Nguồn có luồng video thật (không tính ảnh bìa của file nhạc). Không probe được thì coi như có."""
+        ffprobe_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffprobe.exe")
+        cmd = [
+            ffprobe_bin, "-v", "error", "-select_streams", "v",
+            "-show_entries", "stream=index:stream_disposition=attached_pic", "-of", "csv=p=0", src
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        except (subprocess.CalledProcessError, OSError):
+            return True
+        return any(line.strip().split(",")[-1] == "0" for line in result.stdout.splitlines())
+
+    def _cut_with_ffmpeg(self, src: str, outputs: list[ClipOutput], start_hms: str, duration: int,
+                         resolution: tuple[int, int] | None = None) -> list[ClipOutput]:
+        """Cắt một đoạn ra nhiều file trong một lần mở nguồn và một lần giải mã; trả về các file đã thực sự ghi.
+
+        Mỗi ClipOutput là một tỷ lệ khung hình và một clip con (offset/duration) nằm trong đoạn. Các bản cần encode
+        dùng chung một lần giải mã qua filter split; bản "Gốc" được copy luồng video (clip con lồng của bản copy
+        được seek riêng ở đầu vào). Thumbnail cho thư viện
+        (thumbs/<tên>.png) được xuất ra trong cùng lệnh.
+        """
+        names = ", ".join(os.path.basename(o.dst) for o in outputs)
+        self.log.emit(f"FFmpeg: cắt {start_hms} (dài {duration}s) -> {names}")
         self.progress.emit(75)
 
         ffmpeg_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffmpeg.exe")
 
+        outputs = list(outputs)
+        if any(o.aspect != "Gốc" for o in outputs):
+            if resolution is None:
+                resolution = self._probe_resolution(src)
+            if not resolution:
+                self.log.emit("Cảnh báo: Không thể lấy kích thước video. Bỏ qua thay đổi tỷ lệ.")
+                kept = []
+                for o in outputs:
+                    if o.aspect == "Gốc":
+                        kept.append(o)
+                    elif not any(k.aspect == "Gốc" and k.offset == o.offset and k.duration == o.duration for k in outputs):
+                        kept.append(ClipOutput("Gốc", o.dst, o.offset, o.duration, o.audio_filter))
+                outputs = kept
+        encoded = [o for o in outputs if o.aspect != "Gốc"]
+        w_orig, h_orig = resolution or (0, 0)
+        # Thumbnail của từng clip: khung ở min(1/3 thời lượng, 5s), giống vị trí thư viện vẫn dùng
+        thumb_times = [o.offset + min((o.duration or duration) / 3, 5) for o in outputs]
+        os.makedirs(os.path.dirname(thumbnail_path(outputs[0].dst)), exist_ok=True)
+
         cmd = [
             ffmpeg_bin,
             "-hide_banner", "-loglevel", "error",
+            "-y",
             "-ss", start_hms,
+            "-t", str(duration),
+            "-i", src,
+        ]
+        n_inputs = 1
+
+        # Clip con lồng của bản copy: -ss phía đầu ra khi copy luồng sẽ bỏ video tới keyframe kế tiếp
+        # (video trễ hơn audio, clip bị ngắn), nên mỗi clip con có một đầu vào seek riêng (rẻ khi copy)
+        start_sec = hms_to_sec(start_hms)
+        output_inputs = []
+        for o in outputs:
+            if o.aspect == "Gốc" and (o.offset or (o.duration and o.duration < duration)):
+                cmd.extend(["-ss", sec_to_time(start_sec + o.offset), "-t", str(o.duration or duration - o.offset),
+                            "-i", src])
+                output_inputs.append(n_inputs)
+                n_inputs += 1
+            else:
+                output_inputs.append(0)
+
+        if encoded:
+            # Video đã được giải mã để encode: thumbnail lấy từ cùng các khung đó qua split
+            n = len(encoded) + len(outputs)
+            parts = ["[0:v:0]split=%d%s" % (n, "".join(f"[s{i}]" for i in range(n)))]
+            for i, o in enumerate(encoded):
+                parts.append(f"[s{i}]{aspect_filter(o.aspect, w_orig, h_orig)}[v{i}]")
+            thumb_inputs = [f"[s{len(encoded) + i}]trim=start={t:.3f},setpts=PTS-STARTPTS,"
+                            for i, t in enumerate(thumb_times)]
+        else:
+            # Chỉ copy luồng: seek thẳng tới vị trí thumbnail trong nguồn và giải mã một khung
+            parts = []
+            seek_inputs = {}
+            for t in thumb_times:
+                if t not in seek_inputs:
+                    cmd.extend(["-ss", f"{start_sec + t:.3f}", "-t", "1", "-i", src])
+                    seek_inputs[t] = n_inputs
+                    n_inputs += 1
+            thumb_inputs = [f"[{seek_inputs[t]}:v:0]" for t in thumb_times]
+        for i, o in enumerate(outputs):
+            parts.append(f"{thumb_inputs[i]}{aspect_filter(o.aspect, w_orig, h_orig)},scale=-2:{THUMBNAIL_HEIGHT}[t{i}]")
+        cmd.extend(["-filter_complex", ";".join(parts)])
+
+        for o, k in zip(outputs, output_inputs):
+            if o.aspect == "Gốc":
+                cmd.extend(["-map", f"{k}:v:0", "-c:v", "copy"])
+            else:
+                cmd.extend(["-map", f"[v{encoded.index(o)}]", "-c:v", "libx264"])
+            cmd.extend(["-map", f"{k}:a:0?", "-c:a", "aac"])
+            if o.audio_filter:
+                cmd.extend(["-af", o.audio_filter])
+            # Clip con lồng của bản encode: cắt ở phía đầu ra trên các khung đã giải mã, không mở lại nguồn
+            if k == 0 and o.offset:
+                cmd.extend(["-ss", str(o.offset)])
+            if k == 0 and o.duration and (o.offset or o.duration < duration):
+                cmd.extend(["-t", str(o.duration)])
+            # Ghi ra file .part rồi mới đổi tên: không để lại clip dở dang mang tên thật
+            cmd.extend([
+                "-movflags", "+faststart",
+                "-f", "mp4",
+                o.dst + ".part"
+            ])
+        for i, o in enumerate(outputs):
+            cmd.extend([
+                "-map", f"[t{i}]",
+                "-frames:v", "1", "-update", "1",
+                "-c:v", "png", "-f", "image2",
+                thumbnail_path(o.dst) + ".part"
+            ])
+
+        self._check_cancelled()
+        proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, encoding='utf-8')
+        self._track_process(proc)
+        try:
+            _, stderr = proc.communicate()
+            returncode = proc.returncode
+        finally:
+            self.process = None
+        if returncode != 0:
+            for o in outputs:
+                for part in (o.dst + ".part", thumbnail_path(o.dst) + ".part"):
+                    if os.path.exists(part):
+                        os.remove(part)
+            self._check_cancelled()
+            raise Exception(f"FFmpeg process failed with exit code {returncode}\n{stderr}")
+        # Thumbnail và thông tin clip có trước file .mp4: thư viện thấy clip là có đủ, không gọi ffmpeg/ffprobe
+        for o in outputs:
+            thumb = thumbnail_path(o.dst)
+            if os.path.exists(thumb + ".part"):
+                os.replace(thumb + ".part", thumb)
+            write_clip_info(o.dst, duration=o.duration or duration)
+        for o in outputs:
+            os.replace(o.dst + ".part", o.dst)
+        return outputs
+
+    def _measure_loudness(self, src: str, start: int, duration: int) -> dict | None:
+        """Lượt đo loudnorm rẻ: chỉ giải mã audio của đoạn, không đụng tới video."""
+        ffmpeg_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffmpeg.exe")
+        cmd = [
+            ffmpeg_bin, "-hide_banner", "-nostats",
+            "-ss", sec_to_time(start), "-t", str(duration),
             "-i", src,
-            "-t", str(duration)
+            "-vn", "-sn", "-dn",
+            "-af", f"loudnorm=I={self.cfg.loudness_target}:TP={LOUDNESS_TRUE_PEAK}:LRA=11:print_format=json",
+            "-f", "null", "-",
         ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', check=True)
+            return json.loads(result.stderr[result.stderr.rindex("{"):result.stderr.rindex("}") + 1])
+        except (subprocess.CalledProcessError, ValueError):
+            return None
+
+    def _loudness_filters(self, prepared: PreparedSource, moment: HighlightMoment, rms=None) -> dict[int, str]:
+        """Bộ lọc chuẩn hóa âm lượng cho từng clip của một khoảnh khắc (chỉ một lượt encode)."""
+        target = self.cfg.loudness_target
+        limiter = f"alimiter=limit={10 ** (LOUDNESS_TRUE_PEAK / 20):.3f}:level=disabled"
+        filters = {}
+        if rms is not None:
+            # Dùng lại RMS từ bước phân tích: không cần lượt đo thứ nhất
+            for d, clip_start in moment.clips.items():
+                measured = estimate_loudness(rms, clip_start, d)
+                if measured is not None:
+                    gain = max(-30.0, min(30.0, target - measured))
+                    filters[d] = f"volume={gain:.2f}dB,{limiter}"
+            return filters
+
+        m = self._measure_loudness(prepared.source_video, moment.start, moment.duration)
+        if not m:
+            self.log.emit("Cảnh báo: Không đo được độ lớn âm thanh, bỏ qua chuẩn hóa.")
+            return filters
+        loudnorm = (
+            f"loudnorm=I={target}:TP={LOUDNESS_TRUE_PEAK}:LRA=11"
+            f":measured_I={m['input_i']}:measured_TP={m['input_tp']}:measured_LRA={m['input_lra']}"
+            f":measured_thresh={m['input_thresh']}:offset={m['target_offset']}:linear=true,aresample=48000"
+        )
+        return {d: loudnorm for d in moment.clips}
+
+    def _collect_signals(self, profiler: JobProfiler) -> dict:
+        """Các tín hiệu lấy được mà không cần tải/giải mã audio."""
+        signals = {}
+        if "heatmap" in self.cfg.highlight_signals:
+            with profiler.stage("heatmap"):
+                info = self.info or {}
+                env = heatmap_envelope(info.get("heatmap"), info.get("duration"))
+            if env is not None:
+                self.log.emit("Đã có dữ liệu Most replayed từ YouTube.")
+                signals["heatmap"] = env
+            else:
+                self.log.emit("Không có dữ liệu Most replayed cho nguồn này.")
+        if "captions" in self.cfg.highlight_signals:
+            with profiler.stage("captions"):
+                text = self._fetch_subtitles()
+                env = None
+                if text:
+                    duration = (self.info or {}).get("duration")
+                    env = caption_envelope(parse_subtitles(text), duration, self.cfg.caption_keywords)
+            if env is not None:
+                signals["captions"] = env
+            else:
+                self.log.emit("Không tìm thấy phụ đề cho nguồn này.")
+        return signals
+
+    def _fetch_subtitles(self) -> str | None:
+        """Tải phụ đề (tải lên hoặc tự động) qua yt-dlp, hoặc đọc file .vtt/.srt cạnh file cục bộ."""
+        if is_direct_source(self.cfg.url):
+            path = find_sidecar_subtitles(self.cfg.url)
+            if not path:
+                return None
+            self.log.emit(f"Đọc phụ đề: {os.path.basename(path)}")
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return f.read()
+
+        info = self.info or {}
+        lang = (info.get("language") or "").split("-")[0]
+        preferred = [l for l in (lang + "-orig", lang, "vi", "en") if l and l != "-orig"]
+        for key in ("subtitles", "automatic_captions"):
+            tracks = info.get(key) or {}
+            langs = [l for l in preferred if l in tracks] or list(tracks)[:1]
+            for l in langs:
+                fmts = {f.get("ext"): f for f in tracks[l] if f.get("url")}
+                fmt = fmts.get("vtt") or fmts.get("srt")
+                if not fmt:
+                    continue
+                self.log.emit(f"Đang tải phụ đề ({l}, {fmt['ext']})...")
+                with YoutubeDL(self._ydl_common()) as ydl:
+                    return ydl.urlopen(fmt["url"]).read().decode("utf-8", errors="replace")
+        return None
 
-        video_codec = "copy"
-        filters = []
+    def _prepare_source(self, profiler: JobProfiler) -> PreparedSource:
+        """Lấy metadata và chuẩn bị đầu vào cho bước phân tích (chưa phân tích)."""
+        direct = is_direct_source(self.cfg.url)
+        self.manifest = JobManifest.open(self.cfg, self.cfg.resume)
+        if self.manifest.done("plan"):
+            plan = self.manifest.get("plan")
+            self.title = plan["title"]
+            self.log.emit(f"Tiếp tục job dang dở: {self.title} (bỏ qua metadata và phân tích)")
+            moments = [HighlightMoment(m["start"], m["duration"], m["score"], {int(k): v for k, v in m["clips"].items()})
+                       for m in plan["moments"]]
+            audio_filters = [{int(k): v for k, v in f.items()} for f in plan["audio_filters"]] if plan.get("audio_filters") else None
+            return PreparedSource(plan["title"], plan["kind"], plan["source_video"], None, None, plan["temp_files"],
+                                  moments=moments, audio_filters=audio_filters)
+
+        with profiler.stage("metadata"):
+            title = direct_source_title(self.cfg.url) if direct else self._get_title()
+            if direct and not self._has_video_stream(self.cfg.url):
+                raise Exception(f"Nguồn không có luồng video (chỉ có audio?), không thể cắt clip: {self.cfg.url}")
+        self.title = title
+        self.log.emit(f"Video: {title}")
+
+        signals = self._collect_signals(profiler)
+        wants_motion = "motion" in self.cfg.highlight_signals
+        needs_audio = "audio" in self.cfg.highlight_signals or not (signals or wants_motion)
+        if not needs_audio:
+            self.log.emit("Bỏ qua bước tải và phân tích audio.")
+        elif "audio" not in self.cfg.highlight_signals:
+            self.log.emit("Không có tín hiệu khác, dùng phân tích audio.")
+
+        if direct:
+            # File cục bộ / URL HTTP: phân tích và cắt trực tiếp, không tải về
+            if needs_audio:
+                self.log.emit("Nguồn trực tiếp: bỏ qua bước tải, phân tích audio từ nguồn...")
+            return PreparedSource(title, "direct", self.cfg.url, self.cfg.url if needs_audio else None, signals=signals,
+                                  motion_src=self.cfg.url if wants_motion else None)
+
+        temp_full_video_path = self.manifest.temp_path(f"{title}_full.mp4")
+        if wants_motion and (stream := self._select_video_stream()):
+            motion_src, motion_headers = stream
+        else:
+            motion_src, motion_headers = None, None
 
-        if self.cfg.aspect_ratio != "Gốc":
-            ffprobe_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffprobe.exe")
-            get_res_cmd = [
-                ffprobe_bin, "-v", "error", "-select_streams", "v:0",
-                "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", src
-            ]
+        if not needs_audio:
+            prepared = PreparedSource(title, "none", temp_full_video_path, None, None, [temp_full_video_path], signals)
+        elif self.cfg.streaming_analysis and (stream := self._select_audio_stream()):
+            stream_url, headers = stream
+            prepared = PreparedSource(title, "stream", temp_full_video_path, stream_url, headers, [temp_full_video_path], signals)
+        else:
+            temp_audio_path = self.manifest.get("download_audio").get("path")
+            if self.manifest.owns(temp_audio_path):
+                self.log.emit("Tiếp tục: dùng lại audio đã tải.")
+            else:
+                with profiler.stage("download_audio"):
+                    temp_audio_path = self._download_audio_wav(self.manifest.temp_path("audio"))
+                self.manifest.mark("download_audio", path=temp_audio_path)
+            prepared = PreparedSource(title, "wav", temp_full_video_path, temp_audio_path, None,
+                                      [temp_audio_path, temp_full_video_path], signals)
+        prepared.motion_src, prepared.motion_headers = motion_src, motion_headers
+        return prepared
+
+    def _analyze(self, profiler: JobProfiler, prepared: PreparedSource):
+        if prepared.analysis_src is None:
+            return None
+        self._check_cancelled()
+        if self.analysis_pool is not None:
+            with profiler.stage("analysis_pool"):
+                ffmpeg_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffmpeg.exe")
+                token = uuid.uuid4().hex
+                future = self.analysis_pool.submit(prepared.analysis_src, ffmpeg_bin, prepared.headers, token)
+                return self._wait_future(future, token)
+        if prepared.kind == "wav":
+            self.log.emit("Đang phân tích audio để tìm highlight...")
+            with profiler.stage("librosa_load"):
+                y, sr = load_audio(prepared.analysis_src)
+            with profiler.stage("rms"):
+                rms = rms_envelope(y, sr)
+                del y
+            return rms
+        with profiler.stage("stream_audio" if prepared.kind == "stream" else "decode_audio"):
+            return self._stream_audio_envelope(prepared.analysis_src, prepared.headers)
+
+    def _analyze_motion(self, profiler: JobProfiler, prepared: PreparedSource, src: str | None = None):
+        src = src or prepared.motion_src
+        if src is None:
+            return None
+        self.log.emit("Đang phân tích chuyển động (video thu nhỏ)...")
+        try:
+            with profiler.stage("motion"):
+                return motion_envelope(src, os.path.join(self._resolve_ffmpeg_bin(), "ffmpeg.exe"),
+                                       headers=prepared.motion_headers if src == prepared.motion_src else None,
+                                       on_start=self._track_process)
+        except Exception as e:
+            self._check_cancelled()
+            self.log.emit(f"Cảnh báo: Không thể phân tích chuyển động: {e}")
+            return None
+        finally:
+            self.process = None
+
+    def _ensure_video(self, profiler: JobProfiler, prepared: PreparedSource):
+        if prepared.kind == "direct":
+            return
+        if self.manifest.done("download_video") and self.manifest.owns(prepared.source_video):
+            self.log.emit("Tiếp tục: dùng lại video gốc đã tải.")
+            return
+        with profiler.stage("download_video"):
+            self._download_full_video(prepared.source_video)
+        self.manifest.mark("download_video", path=prepared.source_video)
+
+    def _render(self, profiler: JobProfiler, prepared: PreparedSource, rms, motion=None):
+        """Chọn highlight từ các tín hiệu, tải video (nếu cần) và cắt clip."""
+        if prepared.moments is not None:
+            moments, audio_filters = prepared.moments, prepared.audio_filters
+        else:
+            if motion is None and prepared.motion_src is None and "motion" in self.cfg.highlight_signals:
+                # Không có luồng video nhẹ: tính chuyển động từ video gốc (vẫn cần tải để cắt)
+                self._ensure_video(profiler, prepared)
+                motion = self._analyze_motion(profiler, prepared, prepared.source_video)
+
+            with profiler.stage("select"):
+                signals = dict(prepared.signals)
+                if rms is not None:
+                    signals["audio"] = rms
+                if motion is not None:
+                    signals["motion"] = motion
+                envelope = combine_signals(signals)
+                moments = plan_highlights(envelope, self.cfg.clip_durations, self.cfg.num_clips)
+
+            if not moments:
+                raise Exception("Không tìm thấy đoạn highlight nào.")
 
+            audio_filters = None
+            if self.cfg.loudness_target is not None and rms is not None:
+                with profiler.stage("loudness"):
+                    audio_filters = [self._loudness_filters(prepared, m, rms) for m in moments]
+
+            self.manifest.mark(
+                "plan",
+                title=prepared.title,
+                kind=prepared.kind,
+                source_video=prepared.source_video,
+                temp_files=prepared.temp_files,
+                moments=[asdict(m) for m in moments],
+                audio_filters=audio_filters,
+            )
+
+        self._check_cancelled()
+        self._ensure_video(profiler, prepared)
+
+        if not os.path.exists(self.cfg.output_path):
+            os.makedirs(self.cfg.output_path)
+
+        resolution = None
+        if any(a != "Gốc" for a in self.cfg.aspect_ratios):
+            with profiler.stage("probe"):
+                resolution = self._probe_resolution(prepared.source_video)
+
+        ffprobe_bin = os.path.join(self._resolve_ffmpeg_bin(), "ffprobe.exe")
+        multi_duration = len(set(self.cfg.clip_durations)) > 1
+        for i, moment in enumerate(moments):
+            outputs = []
+            for d, clip_start in sorted(moment.clips.items(), reverse=True):
+                dur_suffix = f"_{d}s" if multi_duration else ""
+                for aspect in self.cfg.aspect_ratios:
+                    name = f"{prepared.title}_highlight_{i+1}{dur_suffix}{ASPECT_SUFFIXES[aspect]}.mp4"
+                    outputs.append(ClipOutput(aspect, os.path.join(self.cfg.output_path, name), clip_start - moment.start, d))
+
+            self._check_cancelled()
+            pending = [o for o in outputs
+                       if not (self.manifest.clip_done(o.dst) and validate_clip(o.dst, o.duration, ffprobe_bin))]
+            self.outputs.extend(o.dst for o in outputs if o not in pending)
+            if not pending:
+                self.log.emit(f"Tiếp tục: bỏ qua highlight {i+1} (đã có đủ clip hợp lệ).")
+                continue
+
+            if self.cfg.loudness_target is not None:
+                if audio_filters is not None:
+                    filters = audio_filters[i]
+                else:
+                    with profiler.stage(f"loudness_{i+1}"):
+                        filters = self._loudness_filters(prepared, moment, None)
+                for o in pending:
+                    o.audio_filter = filters.get(o.duration)
+
+            with profiler.stage(f"encode_{i+1}"):
+                written = self._cut_with_ffmpeg(prepared.source_video, pending, sec_to_time(moment.start),
+                                                moment.duration, resolution)
+            # Không lấy được kích thước video: bản 9:16 trùng với bản Gốc bị bỏ, không đánh dấu là đã xong
+            for o in written:
+                self.manifest.set_clip(o.dst, "done")
+                self.outputs.append(o.dst)
+
+        self._cleanup(prepared)
+        self.manifest.remove()
+
+    def _cleanup(self, prepared: PreparedSource):
+        for p in prepared.temp_files:
             try:
-                result = subprocess.run(get_res_cmd, capture_output=True, text=True, check=True)
-                w_orig, h_orig = map(int, result.stdout.strip().split('x'))
-                video_codec = "libx264"
-            except (subprocess.CalledProcessError, ValueError):
-                self.log.emit("Cảnh báo: Không thể lấy kích thước video. Bỏ qua thay đổi tỷ lệ.")
-                video_codec = "copy"
-                self.cfg.aspect_ratio = "Gốc"
-
-        if self.cfg.aspect_ratio == "Dọc 9:16 (Cắt)":
-            new_w = int(h_orig * 9 / 16)
-            filters.append(f"crop={new_w}:{h_orig}")
-        elif self.cfg.aspect_ratio == "Dọc 9:16 (Viền đen)":
-            new_h = int(w_orig * 16 / 9)
-            pad_y = (new_h - h_orig) // 2
-            filters.append(f"pad=width={w_orig}:height={new_h}:x=0:y={pad_y}:color=black")
-
-        if filters:
-            cmd.extend(["-vf", ",".join(filters), "-c:v", video_codec])
-        else:
-            cmd.extend(["-c:v", video_codec])
+                if os.path.exists(p):
+                    os.remove(p)
+            except Exception:
+                pass
+        try:
+            os.rmdir(self.manifest.temp_dir)
+        except OSError:
+            pass
 
-        cmd.extend([
-            "-c:a", "aac",
-            "-movflags", "+faststart",
-            "-y",
-            dst
-        ])
+    def run(self):
+        profiler = JobProfiler(self.cfg.profile, self.cfg.profile_python)
+        profiler.start()
+        error = None
+        try:
+            prepared = self._prepare_source(profiler)
+            rms = self._analyze(profiler, prepared)
+            motion = self._analyze_motion(profiler, prepared)
+            self._render(profiler, prepared, rms, motion)
+            self.progress.emit(100)
+        except Exception as e:
+            # yt-dlp bọc lỗi từ progress hook trong DownloadError
+            error = "Đã hủy job." if self._cancelled else str(e)
+        finally:
+            self._write_profile_report(profiler, self.title, error)
 
+        if error is None:
+            self.done.emit(self.cfg.output_path)
+        else:
+            self.error.emit(error)
+
+    def _write_profile_report(self, profiler: JobProfiler, title: str | None, error: str | None):
         try:
-            subprocess.run(cmd, check=True, text=True, stderr=subprocess.PIPE, encoding='utf-8')
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"FFmpeg process failed with exit code {e.returncode}\n{e.stderr}")
+            report_path = os.path.join(self.cfg.output_path, f"{title or 'job'}_profile.json")
+            written = profiler.write_report(
+                report_path,
+                title=title,
+                url=self.cfg.url,
+                error=error,
+                settings=asdict(self.cfg),
+            )
+            if written:
+                self.log.emit(f"Đã ghi báo cáo hiệu năng: {written}")
+        except Exception as e:
+            self.log.emit(f"Cảnh báo: Không thể ghi báo cáo hiệu năng: {e}")
+        finally:
+            profiler.stop()
+
+class BatchHighlightWorker(QObject):
+    """Chạy nhiều job: phân tích song song trong AnalysisPool, tải và cắt lần lượt trong luồng này."""
+    log = pyqtSignal(str)
+    done = pyqtSignal(str)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+
+    def __init__(self, cfgs: list[JobConfig], analysis_workers: int = 2, parent=None):
+        super().__init__(parent)
+        self.cfgs = cfgs
+        self.analysis_workers = analysis_workers
+
+    def _make_worker(self, index: int, cfg: JobConfig) -> HighlightWorker:
+        worker = HighlightWorker(cfg)
+        worker.log.connect(lambda msg, n=index: self.log.emit(f"[{n}/{len(self.cfgs)}] {msg}"))
+        return worker
 
     def run(self):
+        total = len(self.cfgs)
+        pool = AnalysisPool(self.analysis_workers)
+        jobs = []
+        failures = []
+        self.log.emit(f"Batch: {total} nguồn, {pool.workers} tiến trình phân tích")
         try:
-            title = self._get_title()
-            self.log.emit(f"Video: {title}")
+            # 1) Metadata / tải audio lần lượt, gửi phân tích vào pool ngay khi có đầu vào
+            for i, cfg in enumerate(self.cfgs, start=1):
+                worker = self._make_worker(i, cfg)
+                profiler = JobProfiler(cfg.profile, cfg.profile_python)
+                profiler.start()
+                try:
+                    prepared = worker._prepare_source(profiler)
+                    ffmpeg_bin = os.path.join(worker._resolve_ffmpeg_bin(), "ffmpeg.exe")
+                    future = motion_future = None
+                    if prepared.analysis_src is not None:
+                        future = pool.submit(prepared.analysis_src, ffmpeg_bin, prepared.headers)
+                    if prepared.motion_src is not None:
+                        motion_future = pool.submit_motion(prepared.motion_src, ffmpeg_bin, prepared.motion_headers)
+                    jobs.append((worker, profiler, prepared, future, motion_future))
+                except Exception as e:
+                    failures.append(f"{cfg.url}: {e}")
+                    worker._write_profile_report(profiler, worker.title, str(e))
+                self.progress.emit(int(30 * i / total))
+
+            # 2) Nhận envelope, tải video và cắt clip
+            for n, (worker, profiler, prepared, future, motion_future) in enumerate(jobs, start=1):
+                error = None
+                try:
+                    rms = motion = None
+                    if future is not None:
+                        with profiler.stage("analysis_pool"):
+                            rms = future.result()
+                    if motion_future is not None:
+                        with profiler.stage("motion_pool"):
+                            try:
+                                motion = motion_future.result()
+                            except Exception as e:
+                                worker.log.emit(f"Cảnh báo: Không thể phân tích chuyển động: {e}")
+                    worker._render(profiler, prepared, rms, motion)
+                except Exception as e:
+                    # Giữ file tạm và manifest để có thể tiếp tục job sau
+                    error = str(e)
+                    failures.append(f"{worker.cfg.url}: {e}")
+                finally:
+                    worker._write_profile_report(profiler, worker.title, error)
+                self.progress.emit(30 + int(70 * n / max(1, len(jobs))))
+        finally:
+            pool.shutdown()
+
+        if failures and len(failures) == total:
+            self.error.emit("\n".join(failures))
+            return
+        for msg in failures:
+            self.log.emit(f"Lỗi: {msg}")
+        self.progress.emit(100)
+        self.done.emit(self.cfgs[-1].output_path)
 
-            temp_audio_path = "temp_audio.wav"
-            temp_full_video_path = f"{title}_full.mp4"
+# ==========================
+# Job server (HTTP API)
+# ==========================
+HIGHLIGHT_SIGNALS = ("audio", "heatmap", "captions", "motion")
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+QUALITIES = ("1080p", "720p")
+JOB_BOOL_FIELDS = ("profile", "profile_python", "streaming_analysis", "resume")
+JOB_LIST_FIELDS = ("clip_durations", "aspect_ratios", "highlight_signals", "caption_keywords")
+
+def job_config_from_dict(data: dict, allow_ffmpeg_path: bool = False) -> JobConfig:
+    """Tạo JobConfig từ JSON; các trường không có lấy từ config.ini giống giao diện.
+
+    Kiểm tra kiểu và phạm vi từng trường (ValueError nếu sai). 'ffmpeg_path' chọn file thực thi sẽ được chạy
+    nên chỉ được nhận khi allow_ffmpeg_path (người vận hành bật --allow-ffmpeg-path).
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Nội dung job phải là một object JSON.")
+    known = {f.name for f in fields(JobConfig)}
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise ValueError(f"Trường không hợp lệ: {', '.join(unknown)}")
+    if "ffmpeg_path" in data and not allow_ffmpeg_path:
+        raise ValueError("Không được đặt 'ffmpeg_path' qua API (máy chủ dùng FFmpeg trong config.ini).")
+    if not isinstance(data.get("url"), str) or not data["url"].strip():
+        raise ValueError("Thiếu 'url'.")
+    for key in ("ffmpeg_path", "output_path", "quality"):
+        if key in data and not isinstance(data[key], str):
+            raise ValueError(f"'{key}' phải là chuỗi.")
+    if data.get("cookies_path") is not None and not isinstance(data["cookies_path"], str):
+        raise ValueError("'cookies_path' phải là chuỗi hoặc null.")
+    for key in JOB_BOOL_FIELDS:
+        if key in data and not isinstance(data[key], bool):
+            raise ValueError(f"'{key}' phải là true/false.")
+    if "num_clips" in data and (isinstance(data["num_clips"], bool) or not isinstance(data["num_clips"], int)):
+        raise ValueError("'num_clips' phải là số nguyên.")
+    loudness = data.get("loudness_target")
+    if loudness is not None and (isinstance(loudness, bool) or not isinstance(loudness, (int, float))):
+        raise ValueError("'loudness_target' phải là số (LUFS) hoặc null.")
+    for key in JOB_LIST_FIELDS:
+        if key not in data:
+            continue
+        items = data[key]
+        if key == "clip_durations" and isinstance(items, int) and not isinstance(items, bool):
+            items = [items]
+        if not isinstance(items, list):
+            raise ValueError(f"'{key}' phải là một danh sách.")
+        item_type = int if key == "clip_durations" else str
+        if not all(isinstance(x, item_type) and not isinstance(x, bool) for x in items):
+            raise ValueError(f"'{key}' chỉ được chứa {'số nguyên' if item_type is int else 'chuỗi'}.")
+
+    ffmpeg_path, cookies_path, output_path, quality, num_clips, aspect_ratios = load_config()
+    values = dict(
+        clip_durations=(30,),
+        ffmpeg_path=ffmpeg_path or find_ffmpeg_in_path() or '',
+        cookies_path=cookies_path or None,
+        output_path=output_path,
+        quality=quality,
+        num_clips=num_clips,
+        aspect_ratios=aspect_ratios,
+    )
+    values.update(data)
+    if isinstance(values["clip_durations"], int):
+        values["clip_durations"] = (values["clip_durations"],)
+    for key in JOB_LIST_FIELDS:
+        if key in values:
+            values[key] = tuple(values[key])
+    values["clip_durations"] = tuple(sorted(set(values["clip_durations"])))
+    if values.get("loudness_target") is not None:
+        values["loudness_target"] = float(values["loudness_target"])
+
+    cfg = JobConfig(**values)
+    if not cfg.clip_durations or not all(5 <= d <= 600 for d in cfg.clip_durations):
+        raise ValueError("Thời lượng không hợp lệ (5-600 giây).")
+    if not 1 <= cfg.num_clips <= 10:
+        raise ValueError("'num_clips' phải trong khoảng 1-10.")
+    if cfg.quality not in QUALITIES:
+        raise ValueError(f"Chất lượng không hợp lệ (chọn trong: {', '.join(QUALITIES)}).")
+    if cfg.loudness_target is not None and not -30 <= cfg.loudness_target <= -5:
+        raise ValueError("'loudness_target' phải trong khoảng -30 đến -5 LUFS.")
+    if not cfg.aspect_ratios or not set(cfg.aspect_ratios) <= set(ASPECT_RATIOS):
+        raise ValueError(f"Tỷ lệ khung hình không hợp lệ (chọn trong: {', '.join(ASPECT_RATIOS)}).")
+    if not cfg.highlight_signals or not set(cfg.highlight_signals) <= set(HIGHLIGHT_SIGNALS):
+        raise ValueError(f"Tín hiệu highlight không hợp lệ (chọn trong: {', '.join(HIGHLIGHT_SIGNALS)}).")
+    if not cfg.output_path:
+        raise ValueError("Thiếu 'output_path'.")
+    if not cfg.ffmpeg_path:
+        raise ValueError("Không tìm thấy FFmpeg; cấu hình 'ffmpeg_path' trong config.ini.")
+    return cfg
 
-            self._download_audio_wav()
+@dataclass
+class ServerJob:
+    id: str
+    cfg: JobConfig
+    status: str = "queued"
+    progress: int = 0
+    log: deque = field(default_factory=lambda: deque(maxlen=200))
+    outputs: list[str] = field(default_factory=list)
+    error: str | None = None
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    worker: HighlightWorker | None = None
+
+    def to_dict(self, verbose: bool = False) -> dict:
+        d = {
+            "id": self.id,
+            "url": self.cfg.url,
+            "status": self.status,
+            "progress": self.progress,
+            "outputs": list(self.outputs),
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if verbose:
+            d["settings"] = asdict(self.cfg)
+            d["log"] = list(self.log)
+        return d
+
+class JobServer:
+    """Hàng đợi job dùng chung cho API: pool luồng chạy job và AnalysisPool luôn sẵn sàng giữa các job."""
+
+    def __init__(self, workers: int = 1, analysis_workers: int = 2):
+        self.workers = max(1, workers)
+        self.jobs: dict[str, ServerJob] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._python_profile_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="highlight-job")
+        # Tiến trình phân tích được giữ lại giữa các job (đã nạp numpy, không phải spawn lại)
+        self.analysis_pool = AnalysisPool(analysis_workers)
+
+    def submit(self, cfg: JobConfig) -> ServerJob:
+        with self._lock:
+            # Job trùng thiết lập dùng chung manifest và thư mục tạm: trả về job đang chờ/chạy thay vì chạy song song
+            key = JobManifest.job_id(cfg)
+            for job in self.jobs.values():
+                if job.status in ("queued", "running") and JobManifest.job_id(job.cfg) == key \
+                        and job.cfg.output_path == cfg.output_path:
+                    return job
+            job = ServerJob(uuid.uuid4().hex[:12], cfg)
+            self.jobs[job.id] = job
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict(verbose=True) if job else None
+
+    def list_jobs(self) -> list[dict]:
+        with self._lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.time()
+            elif job.status == "running" and job.worker is not None:
+                job.worker.cancel()
+            return job.to_dict()
+
+    def _append_log(self, job: ServerJob, msg: str):
+        with self._lock:
+            job.log.append(msg)
+
+    def _run_job(self, job: ServerJob):
+        # cProfile (Python 3.12+) chỉ cho một profiler hoạt động trong tiến trình: chạy lần lượt các job profile_python
+        with self._python_profile_lock if job.cfg.profile_python else nullcontext():
+            self._run_job_locked(job)
+
+    def _run_job_locked(self, job: ServerJob):
+        with self._lock:
+            if job.status != "queued":
+                return
+            job.status = "running"
+            job.started = time.time()
+            worker = HighlightWorker(job.cfg)
+            job.worker = worker
+        worker.analysis_pool = self.analysis_pool
+        result = {}
+        # Không có event loop Qt: tín hiệu được gọi trực tiếp trong luồng của job
+        worker.log.connect(lambda msg: self._append_log(job, msg))
+        worker.progress.connect(lambda value: setattr(job, "progress", value))
+        worker.done.connect(lambda _: result.setdefault("ok", True))
+        worker.error.connect(lambda msg: result.setdefault("error", msg))
+        try:
+            worker.run()
+        except Exception as e:
+            result.setdefault("error", str(e))
+        with self._lock:
+            job.worker = None
+            job.finished = time.time()
+            job.outputs = list(worker.outputs)
+            if worker._cancelled:
+                job.status = "cancelled"
+            elif "error" in result:
+                job.status = "failed"
+                job.error = result["error"]
+            else:
+                job.status = "done"
+
+    def list_outputs(self) -> list[dict]:
+        """Các clip .mp4 trong thư mục đầu ra mặc định và thư mục của các job đã gửi."""
+        with self._lock:
+            dirs = {job.cfg.output_path for job in self.jobs.values()}
+        dirs.add(load_config()[2])
+        outputs = []
+        for d in sorted(dirs):
+            if not os.path.isdir(d):
+                continue
+            for name in sorted(os.listdir(d)):
+                path = os.path.join(d, name)
+                if name.lower().endswith(".mp4") and os.path.isfile(path):
+                    st = os.stat(path)
+                    outputs.append({"path": path, "size": st.st_size, "modified": st.st_mtime})
+        return outputs
+
+    def metrics(self) -> dict:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        counts = {s: 0 for s in JOB_STATUSES}
+        for job in jobs:
+            counts[job.status] += 1
+        finished = [job for job in jobs if job.status == "done"]
+        durations = [job.finished - job.started for job in finished]
+        uptime = time.time() - self.started
+        return {
+            "workers": self.workers,
+            "analysis_workers": self.analysis_pool.workers,
+            "queue_depth": counts["queued"],
+            "running": counts["running"],
+            "jobs": counts,
+            "clips_written": sum(len(job.outputs) for job in finished),
+            "uptime_s": round(uptime, 1),
+            "throughput_jobs_per_hour": round(len(finished) * 3600 / uptime, 3) if uptime > 0 else 0.0,
+            "avg_job_s": round(sum(durations) / len(durations), 1) if durations else None,
+        }
 
-            self.log.emit("Đang phân tích audio để tìm highlight...")
-            highlight_points = find_highlight(temp_audio_path, self.cfg.clip_duration, self.cfg.num_clips)
+    def shutdown(self):
+        with self._lock:
+            for job in self.jobs.values():
+                if job.status == "queued":
+                    job.status = "cancelled"
+                elif job.worker is not None:
+                    job.worker.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.analysis_pool.shutdown(cancel=True)
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """POST /jobs, GET /jobs, GET /jobs/<id>, DELETE /jobs/<id> (hoặc POST /jobs/<id>/cancel), GET /outputs, GET /metrics."""
+    server_version = "HighlightMaker/1.0"
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _parts(self) -> list[str]:
+        return [p for p in urllib.parse.urlparse(self.path).path.split("/") if p]
+
+    def _cancel(self, job_id: str):
+        job = self.server.job_server.cancel(job_id)
+        if job is None:
+            self._send_json(404, {"error": "Không tìm thấy job."})
+        else:
+            self._send_json(200, job)
+
+    def do_GET(self):
+        parts = self._parts()
+        job_server = self.server.job_server
+        if parts == ["jobs"]:
+            self._send_json(200, job_server.list_jobs())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = job_server.get(parts[1])
+            if job is None:
+                self._send_json(404, {"error": "Không tìm thấy job."})
+            else:
+                self._send_json(200, job)
+        elif parts == ["outputs"]:
+            self._send_json(200, job_server.list_outputs())
+        elif parts == ["metrics"]:
+            self._send_json(200, job_server.metrics())
+        else:
+            self._send_json(404, {"error": "Không tìm thấy."})
+
+    def do_POST(self):
+        parts = self._parts()
+        # Chỉ nhận JSON: chặn POST "simple" cross-origin từ trình duyệt (form, text/plain) tới cổng cục bộ
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send_json(415, {"error": "Content-Type phải là application/json."})
+            return
+        if parts == ["jobs"]:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                cfg = job_config_from_dict(json.loads(self.rfile.read(length) or b"{}"),
+                                           allow_ffmpeg_path=self.server.allow_ffmpeg_path)
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            job = self.server.job_server.submit(cfg)
+            self._send_json(202, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            self._cancel(parts[1])
+        else:
+            self._send_json(404, {"error": "Không tìm thấy."})
 
-            if not highlight_points:
-                raise Exception("Không tìm thấy đoạn highlight nào.")
+    def do_DELETE(self):
+        parts = self._parts()
+        if len(parts) == 2 and parts[0] == "jobs":
+            self._cancel(parts[1])
+        else:
+            self._send_json(404, {"error": "Không tìm thấy."})
+
+def run_server(host: str = "127.0.0.1", port: int = 8765, workers: int = 1, analysis_workers: int = 2,
+               allow_ffmpeg_path: bool = False):
+    job_server = JobServer(workers, analysis_workers)
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.job_server = job_server
+    httpd.allow_ffmpeg_path = allow_ffmpeg_path
+    print(f"Máy chủ job: http://{host}:{port} ({job_server.workers} job song song, "
+          f"{job_server.analysis_pool.workers} tiến trình phân tích). Ctrl+C để dừng.")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        job_server.shutdown()
 
-            self._download_full_video(temp_full_video_path)
+# ==========================
+# Shared spool directory (multi-node)
+# ==========================
+class SpoolQueue:
+    """Hàng đợi job trên thư mục dùng chung (NAS), không cần broker.
+
+    queue/<id>.json   job chờ hoặc đang chạy (chỉ các trường gửi kèm, phần còn lại lấy từ config.ini của máy chạy)
+    leases/<id>.lock  lease: tạo bằng O_EXCL, mtime được cập nhật làm heartbeat
+    done/, failed/    kết quả
+    """
+
+    def __init__(self, root: str, lease_timeout: float = 120, worker_id: str | None = None):
+        self.root = root
+        self.lease_timeout = lease_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._seen = {}  # lock -> (mtime, chủ lease, thời điểm thấy mtime đó theo đồng hồ máy này)
+        for d in ("queue", "leases", "done", "failed"):
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+
+    def _path(self, kind: str, job_id: str, ext: str = ".json") -> str:
+        return os.path.join(self.root, kind, job_id + ext)
+
+    def _write_json(self, path: str, data: dict):
+        tmp = f"{path}.{self.worker_id}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def _lock_owner(self, lock: str) -> str | None:
+        try:
+            with open(lock, encoding="utf-8") as f:
+                return json.load(f).get("worker")
+        except (OSError, ValueError):
+            return None
+
+    def enqueue(self, data: dict) -> str:
+        job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._write_json(self._path("queue", job_id), data)
+        return job_id
+
+    def _is_stale(self, lock: str) -> bool | None:
+        """None: chưa có lease. Lease hết hạn khi mtime không đổi trong lease_timeout giây
+        (đo bằng đồng hồ máy này nên không phụ thuộc độ lệch giờ giữa các máy)."""
+        try:
+            mtime = os.stat(lock).st_mtime
+        except FileNotFoundError:
+            self._seen.pop(lock, None)
+            return None
+        seen = self._seen.get(lock)
+        if seen is None or seen[0] != mtime:
+            self._seen[lock] = (mtime, self._lock_owner(lock), time.monotonic())
+            return False
+        return time.monotonic() - seen[2] >= self.lease_timeout
+
+    def _reclaim(self, lock: str) -> str | None:
+        """Thu hồi lease của worker đã chết: chỉ một worker đổi tên được file khóa.
+
+        Giữa lúc kiểm tra và lúc đổi tên, worker khác có thể đã thu hồi và tạo lease mới; nếu file vừa đổi tên
+        không phải lease hết hạn đã quan sát (khác mtime hoặc chủ) thì trả lại nguyên chỗ.
+        """
+        mtime, owner, _ = self._seen.pop(lock)
+        stale = f"{lock}.stale-{self.worker_id}"
+        try:
+            os.rename(lock, stale)
+        except OSError:
+            return None
+        try:
+            taken = os.stat(stale).st_mtime
+        except OSError:
+            return None
+        if taken != mtime or self._lock_owner(stale) != owner:
+            self._restore_lock(stale, lock)
+            return None
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+        return owner or "?"
 
-            if not os.path.exists(self.cfg.output_path):
-                os.makedirs(self.cfg.output_path)
+    def _restore_lock(self, stale: str, lock: str):
+        """Đặt lại lease đang sống đã lỡ đổi tên, không ghi đè lease mới nếu có."""
+        try:
+            os.link(stale, lock)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Thư mục chia sẻ không hỗ trợ hard link
+            if not os.path.exists(lock):
+                os.replace(stale, lock)
+                return
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+    def claim(self, log=print) -> tuple[str, dict] | None:
+        """Nhận job cũ nhất chưa có lease hợp lệ."""
+        for name in sorted(os.listdir(os.path.join(self.root, "queue"))):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-5]
+            lock = self._path("leases", job_id, ".lock")
+            stale = self._is_stale(lock)
+            if stale is False:
+                continue
+            if stale:
+                owner = self._reclaim(lock)
+                if owner is None:
+                    continue
+                log(f"Thu hồi lease của {owner} cho job {job_id}")
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"worker": self.worker_id, "acquired": time.time()}, f)
+            try:
+                with open(self._path("queue", job_id), encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                # Worker khác vừa hoàn thành job này
+                self.release(job_id)
+                continue
+            except ValueError as e:
+                self.finish(job_id, "failed", error=f"File job không hợp lệ: {e}")
+                continue
+            return job_id, data
+        return None
 
-            for i, (start_hms, end_hms) in enumerate(highlight_points):
-                out_mp4 = os.path.join(self.cfg.output_path, f"{title}_highlight_{i+1}.mp4")
-                duration = hms_to_sec(end_hms) - hms_to_sec(start_hms)
-                self._cut_with_ffmpeg(temp_full_video_path, out_mp4, start_hms, duration)
+    def heartbeat(self, job_id: str) -> bool:
+        """Gia hạn lease; False nếu lease đã bị worker khác thu hồi."""
+        lock = self._path("leases", job_id, ".lock")
+        if self._lock_owner(lock) != self.worker_id:
+            return False
+        try:
+            os.utime(lock)
+        except OSError:
+            return False
+        return True
+
+    def release(self, job_id: str):
+        """Trả lease; job vẫn nằm trong queue/ cho worker khác."""
+        lock = self._path("leases", job_id, ".lock")
+        if self._lock_owner(lock) == self.worker_id:
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+    def finish(self, job_id: str, status: str, **result) -> bool:
+        """Ghi kết quả và xóa job khỏi hàng đợi; False (không làm gì) nếu lease đã bị worker khác thu hồi."""
+        if not self.heartbeat(job_id):
+            return False
+        self._write_json(self._path("done" if status == "done" else "failed", job_id),
+                         dict(id=job_id, status=status, worker=self.worker_id, finished=time.time(), **result))
+        try:
+            os.remove(self._path("queue", job_id))
+        except OSError:
+            pass
+        self.release(job_id)
+        return True
+
+def run_spool_worker(root: str, workers: int = 1, analysis_workers: int = 2,
+                     lease_timeout: float = 120, poll_interval: float = 5):
+    """Worker phân tán: nhận job từ thư mục spool và chạy trên JobServer cục bộ (không mở HTTP)."""
+    spool = SpoolQueue(root, lease_timeout)
+    job_server = JobServer(workers, analysis_workers)
+    active = {}  # id job trong spool -> id job trên JobServer
+    print(f"Worker {spool.worker_id}: spool {root} ({job_server.workers} job song song). Ctrl+C để dừng.")
+    try:
+        while True:
+            for spool_id, server_id in list(active.items()):
+                job = job_server.get(server_id)
+                if job["status"] in ("queued", "running"):
+                    if not spool.heartbeat(spool_id):
+                        print(f"Mất lease job {spool_id}, dừng job.")
+                        job_server.cancel(server_id)
+                        del active[spool_id]
+                    continue
+                del active[spool_id]
+                if job["status"] == "cancelled":
+                    spool.release(spool_id)
+                elif not spool.finish(spool_id, job["status"], url=job["url"], outputs=job["outputs"],
+                                      error=job["error"], log=job["log"][-20:]):
+                    print(f"Mất lease job {spool_id}, bỏ kết quả (worker khác đang chạy job).")
+                    continue
+                print(f"Job {spool_id}: {job['status']} ({len(job['outputs'])} clip)")
 
-            # Clean up
-            for p in (temp_audio_path, temp_full_video_path):
+            while len(active) < job_server.workers and (claimed := spool.claim()):
+                spool_id, data = claimed
                 try:
-                    if os.path.exists(p):
-                        os.remove(p)
-                except Exception:
-                    pass
-
-            self.progress.emit(100)
-            self.done.emit(self.cfg.output_path)
+                    cfg = job_config_from_dict(data)
+                except (ValueError, TypeError) as e:
+                    spool.finish(spool_id, "failed", error=str(e))
+                    continue
+                active[spool_id] = job_server.submit(cfg).id
+                print(f"Nhận job {spool_id}: {cfg.url}")
 
-        except Exception as e:
-            self.error.emit(str(e))
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        job_server.shutdown()
+        # Trả job dang dở về hàng đợi; manifest trong output_path giúp worker khác tiếp tục
+        for spool_id in active:
+            spool.release(spool_id)
 
 # ==========================
 # Dark Theme (Fusion)
@@ -513,14 +2345,14 @@ class VideoItemWidget(QFrame):
 
     def generate_thumbnail(self):
         try:
-            thumb_dir = os.path.join(os.path.dirname(self.file_path), "thumbs")
-            thumb_path = os.path.join(thumb_dir, os.path.basename(self.file_path) + ".png")
-            os.makedirs(thumb_dir, exist_ok=True)
+            thumb_path = thumbnail_path(self.file_path)
 
+            # Clip mới đã có thumbnail từ bước cắt; chỉ tạo lại cho clip cũ
             if not os.path.exists(thumb_path):
                 if not self.ffprobe_bin:
                     return
-                duration = get_video_duration(self.file_path, self.ffprobe_bin)
+                os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+                duration = read_clip_info(self.file_path).get("duration") or get_video_duration(self.file_path, self.ffprobe_bin)
                 ss_time = min(duration / 3, 5)
                 ffmpeg_bin = self.ffprobe_bin.replace("ffprobe.exe", "ffmpeg.exe")
                 cmd = [ffmpeg_bin, "-ss", str(ss_time), "-i", self.file_path, "-vframes", "1", "-q:v", "2", thumb_path]
@@ -561,9 +2393,9 @@ class VideoItemWidget(QFrame):
         if confirm == QMessageBox.Yes:
             try:
                 os.remove(self.file_path)
-                thumb_path = os.path.join(os.path.dirname(self.file_path), "thumbs", os.path.basename(self.file_path) + ".png")
-                if os.path.exists(thumb_path):
-                    os.remove(thumb_path)
+                for path in (thumbnail_path(self.file_path), clip_info_path(self.file_path)):
+                    if os.path.exists(path):
+                        os.remove(path)
                 self.setParent(None)
                 self.deleteLater()
             except Exception as e:
@@ -591,8 +2423,10 @@ class VideoListItemWidget(QWidget):
 
         try:
             file_size = get_human_readable_size(file_path)
-            ffprobe_bin = os.path.join(os.path.dirname(ffmpeg_path), "ffprobe.exe")
-            duration = get_video_duration(file_path, ffprobe_bin)
+            duration = read_clip_info(file_path).get("duration")
+            if duration is None:
+                ffprobe_bin = os.path.join(os.path.dirname(ffmpeg_path), "ffprobe.exe")
+                duration = get_video_duration(file_path, ffprobe_bin)
             details_text = f"Kích thước: {file_size} | Độ dài: {sec_to_time(int(duration))}"
             details_label = QLabel(details_text)
             info_layout.addWidget(details_label)
@@ -605,8 +2439,7 @@ class VideoListItemWidget(QWidget):
         self.generate_thumbnail()
 
     def generate_thumbnail(self):
-        thumb_dir = os.path.join(os.path.dirname(self.file_path), "thumbs")
-        thumb_path = os.path.join(thumb_dir, os.path.basename(self.file_path) + ".png")
+        thumb_path = thumbnail_path(self.file_path)
         if os.path.exists(thumb_path):
             pixmap = QPixmap(thumb_path)
             if not pixmap.isNull():
@@ -791,7 +2624,7 @@ class MainWindow(QWidget):
         super().__init__()
         self.setWindowTitle("YouTube Highlight Maker (Dark)")
         self.setMinimumWidth(800)
-        self.ffmpeg_path, self.cookies_path, self.output_path, self.quality, self.num_clips, self.aspect_ratio = load_config()
+        self.ffmpeg_path, self.cookies_path, self.output_path, self.quality, self.num_clips, self.aspect_ratios = load_config()
         self.layout = QVBoxLayout(self)
         self.tabs = QTabWidget(self)
         self.tab1 = QWidget()
@@ -810,11 +2643,16 @@ class MainWindow(QWidget):
 
     def setup_creation_tab(self):
         layout = QVBoxLayout(self.tab1)
-        url_box = QGroupBox("YouTube URL")
-        url_l = QVBoxLayout(url_box)
-        self.url_edit = QLineEdit()
-        self.url_edit.setPlaceholderText("Dán link YouTube vào đây…")
-        url_l.addWidget(self.url_edit)
+        url_box = QGroupBox("Nguồn video")
+        url_l = QHBoxLayout(url_box)
+        self.url_edit = QTextEdit()
+        self.url_edit.setAcceptRichText(False)
+        self.url_edit.setFixedHeight(70)
+        self.url_edit.setPlaceholderText("Dán link YouTube, đường dẫn file hoặc URL HTTP(S) tới file video… (mỗi dòng một nguồn để chạy hàng loạt)")
+        browse_src = QPushButton("Chọn file…")
+        browse_src.clicked.connect(self.choose_source_file)
+        url_l.addWidget(self.url_edit, 1)
+        url_l.addWidget(browse_src)
         layout.addWidget(url_box)
         opt_box = QGroupBox("Tùy chọn")
         opt_l = QVBoxLayout(opt_box)
@@ -830,15 +2668,47 @@ class MainWindow(QWidget):
         self.num_clips_spin.setValue(self.num_clips)
         grid_layout.addWidget(self.num_clips_spin, 0, 3)
         grid_layout.addWidget(QLabel("Thời lượng (giây):"), 1, 0)
-        self.dur_spin = QSpinBox()
-        self.dur_spin.setRange(5, 600)
-        self.dur_spin.setValue(30)
-        grid_layout.addWidget(self.dur_spin, 1, 1)
+        self.dur_edit = QLineEdit("30")
+        self.dur_edit.setPlaceholderText("Ví dụ: 15, 30, 60")
+        self.dur_edit.setToolTip("Một hoặc nhiều thời lượng (5-600 giây), phân tách bằng dấu phẩy; clip ngắn được lồng trong clip dài")
+        grid_layout.addWidget(self.dur_edit, 1, 1)
         grid_layout.addWidget(QLabel("Tỷ lệ khung hình:"), 1, 2)
-        self.aspect_combo = QComboBox()
-        self.aspect_combo.addItems(["Gốc", "Dọc 9:16 (Cắt)", "Dọc 9:16 (Viền đen)"])
-        self.aspect_combo.setCurrentText(self.aspect_ratio)
-        grid_layout.addWidget(self.aspect_combo, 1, 3)
+        aspect_row = QHBoxLayout()
+        self.aspect_cbs = {}
+        for aspect in ASPECT_RATIOS:
+            cb = QCheckBox(aspect)
+            cb.setChecked(aspect in self.aspect_ratios)
+            aspect_row.addWidget(cb)
+            self.aspect_cbs[aspect] = cb
+        grid_layout.addLayout(aspect_row, 1, 3)
+        grid_layout.addWidget(QLabel("Tiến trình phân tích:"), 2, 0)
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.workers_spin.setValue(min(4, max(1, os.cpu_count() or 1)))
+        self.workers_spin.setToolTip("Số tiến trình phân tích audio song song khi chạy nhiều nguồn cùng lúc")
+        grid_layout.addWidget(self.workers_spin, 2, 1)
+        grid_layout.addWidget(QLabel("Tín hiệu highlight:"), 3, 0)
+        signals_row = QHBoxLayout()
+        self.signal_cbs = {
+            "audio": QCheckBox("Âm thanh"),
+            "heatmap": QCheckBox("Most replayed"),
+            "captions": QCheckBox("Phụ đề"),
+            "motion": QCheckBox("Chuyển động"),
+        }
+        self.signal_cbs["audio"].setChecked(True)
+        self.signal_cbs["heatmap"].setToolTip("Dùng biểu đồ \"Most replayed\" của YouTube (nếu có); bỏ qua tải audio khi không chọn Âm thanh")
+        self.signal_cbs["captions"].setToolTip("Dùng mật độ lời thoại và từ khóa trong phụ đề (YouTube hoặc file .vtt/.srt cạnh video)")
+        self.signal_cbs["motion"].setToolTip("Dùng năng lượng chuyển động của hình ảnh (video thu nhỏ 160x90, vài khung/giây)")
+        for cb in self.signal_cbs.values():
+            signals_row.addWidget(cb)
+        signals_row.addStretch()
+        grid_layout.addLayout(signals_row, 3, 1, 1, 3)
+        grid_layout.addWidget(QLabel("Từ khóa phụ đề:"), 4, 0)
+        self.keywords_edit = QLineEdit()
+        self.keywords_edit.setPlaceholderText("Ví dụ: wow, omg, [laughter], [applause] (phân tách bằng dấu phẩy)")
+        self.keywords_edit.setEnabled(False)
+        self.signal_cbs["captions"].toggled.connect(self.keywords_edit.setEnabled)
+        grid_layout.addWidget(self.keywords_edit, 4, 1, 1, 3)
         opt_l.addLayout(grid_layout)
         ff_row = QHBoxLayout()
         self.ff_edit = QLineEdit()
@@ -876,6 +2746,35 @@ class MainWindow(QWidget):
         self.auto_open_cb = QCheckBox("Tự động mở thư mục sau khi hoàn thành")
         self.auto_open_cb.setChecked(True)
         opt_l.addWidget(self.auto_open_cb)
+        profile_row = QHBoxLayout()
+        self.profile_cb = QCheckBox("Ghi báo cáo hiệu năng (JSON)")
+        self.profile_cb.setToolTip("Đo thời gian, CPU và bộ nhớ đỉnh của từng giai đoạn, lưu cạnh các clip đầu ra")
+        self.profile_py_cb = QCheckBox("Kèm cProfile")
+        self.profile_py_cb.setEnabled(False)
+        self.profile_cb.toggled.connect(self.profile_py_cb.setEnabled)
+        profile_row.addWidget(self.profile_cb)
+        profile_row.addWidget(self.profile_py_cb)
+        profile_row.addStretch()
+        opt_l.addLayout(profile_row)
+        loud_row = QHBoxLayout()
+        self.loudness_cb = QCheckBox("Chuẩn hóa âm lượng (LUFS):")
+        self.loudness_cb.setToolTip("Đưa độ lớn các clip về cùng mức; dùng lại số đo từ bước phân tích nên không tốn thêm lượt encode")
+        self.loudness_spin = QSpinBox()
+        self.loudness_spin.setRange(-30, -5)
+        self.loudness_spin.setValue(-14)
+        self.loudness_spin.setEnabled(False)
+        self.loudness_cb.toggled.connect(self.loudness_spin.setEnabled)
+        loud_row.addWidget(self.loudness_cb)
+        loud_row.addWidget(self.loudness_spin)
+        loud_row.addStretch()
+        opt_l.addLayout(loud_row)
+        self.resume_cb = QCheckBox("Tiếp tục job dang dở (nếu có)")
+        self.resume_cb.setChecked(True)
+        self.resume_cb.setToolTip("Khi chạy lại cùng một job sau sự cố, bỏ qua các giai đoạn và clip đã hoàn thành")
+        opt_l.addWidget(self.resume_cb)
+        self.streaming_cb = QCheckBox("Phân tích trong khi tải (video dài)")
+        self.streaming_cb.setToolTip("Giải mã audio ngay khi tải về, cập nhật ứng viên highlight theo từng đoạn thay vì chờ tải xong file WAV")
+        opt_l.addWidget(self.streaming_cb)
         layout.addWidget(opt_box)
         btn_row = QHBoxLayout()
         self.run_btn = QPushButton("Tạo Highlight")
@@ -909,6 +2808,13 @@ class MainWindow(QWidget):
                 self.ff_edit.setText(d)
                 self.library_widget.set_ffmpeg_path(d)
 
+    def choose_source_file(self):
+        exts = " ".join(f"*{e}" for e in MEDIA_EXTENSIONS)
+        files, _ = QFileDialog.getOpenFileNames(self, "Chọn file video", "", f"Media ({exts});;All files (*.*)")
+        if files:
+            current = self.url_edit.toPlainText().strip()
+            self.url_edit.setPlainText("\n".join(([current] if current else []) + files))
+
     def choose_cookies(self):
         f, _ = QFileDialog.getOpenFileName(self, "Chọn cookies.txt", "", "Text files (*.txt);;All files (*.*)")
         if f:
@@ -921,16 +2827,20 @@ class MainWindow(QWidget):
             self.library_widget.set_output_dir(d)
 
     def start_job(self):
-        url = self.url_edit.text().strip()
+        sources = [line.strip() for line in self.url_edit.toPlainText().splitlines() if line.strip()]
         ff_path = self.ff_edit.text().strip()
         out_path = self.out_edit.text().strip()
         cookies_path = self.ck_edit.text().strip()
         quality = self.qual_combo.currentText()
         num_clips = self.num_clips_spin.value()
-        aspect_ratio = self.aspect_combo.currentText()
+        aspect_ratios = tuple(a for a, cb in self.aspect_cbs.items() if cb.isChecked())
+        try:
+            clip_durations = tuple(sorted({int(d) for d in self.dur_edit.text().split(",") if d.strip()}))
+        except ValueError:
+            clip_durations = ()
 
-        if not url:
-            QMessageBox.critical(self, "Lỗi", "Vui lòng nhập YouTube URL.")
+        if not sources:
+            QMessageBox.critical(self, "Lỗi", "Vui lòng nhập YouTube URL hoặc chọn file video.")
             return
         if not ff_path or not (os.path.exists(ff_path) and (os.path.isdir(ff_path) or ff_path.lower().endswith("ffmpeg.exe"))):
             QMessageBox.critical(self, "Lỗi", "Đường dẫn FFmpeg không hợp lệ.")
@@ -938,19 +2848,36 @@ class MainWindow(QWidget):
         if not out_path:
             QMessageBox.critical(self, "Lỗi", "Vui lòng chọn thư mục đầu ra.")
             return
+        highlight_signals = tuple(name for name, cb in self.signal_cbs.items() if cb.isChecked())
+        if not highlight_signals:
+            QMessageBox.critical(self, "Lỗi", "Vui lòng chọn ít nhất một tín hiệu highlight.")
+            return
+        if not aspect_ratios:
+            QMessageBox.critical(self, "Lỗi", "Vui lòng chọn ít nhất một tỷ lệ khung hình.")
+            return
+        if not clip_durations or not all(5 <= d <= 600 for d in clip_durations):
+            QMessageBox.critical(self, "Lỗi", "Thời lượng không hợp lệ (5-600 giây, phân tách bằng dấu phẩy).")
+            return
 
-        save_config(ff_path, cookies_path, out_path, quality, num_clips, aspect_ratio)
+        save_config(ff_path, cookies_path, out_path, quality, num_clips, aspect_ratios)
 
-        cfg = JobConfig(
+        cfgs = [JobConfig(
             url=url,
-            clip_duration=int(self.dur_spin.value()),
+            clip_durations=clip_durations,
             ffmpeg_path=ff_path,
             cookies_path=(cookies_path or None),
             output_path=out_path,
             quality=quality,
             num_clips=num_clips,
-            aspect_ratio=aspect_ratio
-        )
+            aspect_ratios=aspect_ratios,
+            profile=self.profile_cb.isChecked(),
+            profile_python=self.profile_py_cb.isChecked(),
+            streaming_analysis=self.streaming_cb.isChecked(),
+            highlight_signals=highlight_signals,
+            resume=self.resume_cb.isChecked(),
+            loudness_target=float(self.loudness_spin.value()) if self.loudness_cb.isChecked() else None,
+            caption_keywords=tuple(k.strip() for k in self.keywords_edit.text().split(",") if k.strip()),
+        ) for url in sources]
 
         self.run_btn.setEnabled(False)
         self.tabs.setCurrentIndex(0)
@@ -959,7 +2886,10 @@ class MainWindow(QWidget):
         self.append_log(" Bắt đầu…")
 
         self.thread = QThread(self)
-        self.worker = HighlightWorker(cfg)
+        if len(cfgs) == 1:
+            self.worker = HighlightWorker(cfgs[0])
+        else:
+            self.worker = BatchHighlightWorker(cfgs, self.workers_spin.value())
         self.worker.moveToThread(self.thread)
         self.worker.log.connect(self.append_log)
         self.worker.progress.connect(self.progress_bar.setValue)
@@ -1000,7 +2930,40 @@ class MainWindow(QWidget):
 # Entry
 # ==========================
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="YouTube Highlight Maker")
+    parser.add_argument("--server", action="store_true", help="Chạy máy chủ job HTTP thay vì giao diện")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="Số job chạy song song")
+    parser.add_argument("--analysis-workers", type=int, default=2, help="Số tiến trình phân tích audio")
+    parser.add_argument("--allow-ffmpeg-path", action="store_true",
+                        help="Cho phép job gửi qua API chọn 'ffmpeg_path' (mặc định dùng FFmpeg trong config.ini)")
+    parser.add_argument("--spool", metavar="DIR", help="Thư mục hàng đợi dùng chung (NAS): chạy worker phân tán")
+    parser.add_argument("--enqueue", nargs="+", metavar="NGUỒN",
+                        help="Cùng --spool: đưa URL/file video (hoặc file .json mô tả job) vào hàng đợi rồi thoát")
+    parser.add_argument("--lease-timeout", type=float, default=120, help="Số giây không có heartbeat thì thu hồi lease")
+    args, qt_args = parser.parse_known_args()
+    if args.spool and args.enqueue:
+        spool = SpoolQueue(args.spool)
+        for src in args.enqueue:
+            if src.lower().endswith(".json") and os.path.isfile(src):
+                with open(src, encoding="utf-8") as f:
+                    data = json.load(f)
+            else:
+                data = {"url": src}
+            # File cục bộ: lưu đường dẫn tuyệt đối (phải trỏ tới cùng file trên mọi máy, ví dụ ổ NAS)
+            if isinstance(data.get("url"), str) and os.path.isfile(data["url"]):
+                data["url"] = os.path.abspath(data["url"])
+            print(f"{spool.enqueue(data)}: {data.get('url')}")
+        return
+    if args.spool:
+        run_spool_worker(args.spool, args.workers, args.analysis_workers, args.lease_timeout)
+        return
+    if args.server:
+        run_server(args.host, args.port, args.workers, args.analysis_workers, args.allow_ffmpeg_path)
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
     apply_dark_theme(app, accent="#34c759")
     w = MainWindow()
     w.show()
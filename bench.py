@@ -0,0 +1,312 @@
+"""Benchmark offline cho các đường xử lý nóng của ai.py.
+
+Tạo media tổng hợp bằng ffmpeg (không cần mạng), đo:
+  - find_highlight: thông lượng (giây audio / giây thực) và bộ nhớ đỉnh
+  - plan_highlights: xếp hạng nhiều thời lượng (15/30/60 giây) trên một envelope
+  - HighlightWorker._cut_with_ffmpeg: chế độ copy (Gốc) và 9:16
+  - VideoItemWidget.generate_thumbnail
+  - VideoLibraryWidget.refresh_list với hàng nghìn file
+
+Kết quả được lưu thành JSON trong bench_results/ (kèm commit git) để so sánh giữa các commit.
+
+Ví dụ:
+    python bench.py --ffmpeg C:\\ffmpeg\\bin --durations 60,600,3600
+    python bench.py --compare
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+# Chạy Qt không cần màn hình (CI, máy render)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import ai
+
+# ==========================
+# Media tổng hợp
+# ==========================
+def _ffmpeg_bin(ffmpeg_dir: str) -> str:
+    return os.path.join(ffmpeg_dir, "ffmpeg.exe")
+
+def _run_ffmpeg(ffmpeg_dir: str, args: list[str]):
+    cmd = [_ffmpeg_bin(ffmpeg_dir), "-hide_banner", "-loglevel", "error", "-y", *args]
+    subprocess.run(cmd, check=True, capture_output=True, text=True, encoding='utf-8')
+
+def _event_times(duration: int, num_events: int, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    slots = list(range(5, max(6, duration - 5), 30))
+    return sorted(rng.sample(slots, min(num_events, len(slots))))
+
+def _audio_filter(duration: int, events: list[int], event_len: int = 3) -> str:
+    """Nhiễu hồng + tone 440Hz, khuếch đại mạnh tại các thời điểm sự kiện."""
+    gain = "+".join(f"between(t,{t},{t + event_len})" for t in events) or "0"
+    return (
+        f"anoisesrc=d={duration}:c=pink:a=0.05:r=44100[n];"
+        f"sine=f=440:d={duration}:r=44100,volume=0.05[s];"
+        f"[n][s]amix=inputs=2,volume='1+9*({gain})':eval=frame[a]"
+    )
+
+def make_audio(ffmpeg_dir: str, path: str, duration: int, events: list[int]):
+    if os.path.exists(path):
+        return
+    _run_ffmpeg(ffmpeg_dir, [
+        "-filter_complex", _audio_filter(duration, events),
+        "-map", "[a]", "-ac", "1", "-c:a", "pcm_s16le", path,
+    ])
+
+def make_video(ffmpeg_dir: str, path: str, duration: int, events: list[int], size: str):
+    if os.path.exists(path):
+        return
+    _run_ffmpeg(ffmpeg_dir, [
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={duration}",
+        "-filter_complex", _audio_filter(duration, events),
+        "-map", "0:v", "-map", "[a]",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", "60", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", path,
+    ])
+
+# ==========================
+# Đo đạc
+# ==========================
+def _measure(fn):
+    """Đo thời gian thực, CPU (gồm cả tiến trình con ffmpeg/ffprobe đã kết thúc) và bộ nhớ Python đỉnh."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    children0 = ai._children_cpu_time()
+    try:
+        result = fn()
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        children1 = ai._children_cpu_time()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stats = {"wall_s": round(wall, 4)}
+    if children0 is not None and children1 is not None:
+        # Phần lớn công việc cắt/thumbnail nằm trong ffmpeg: cpu_s tính cả CPU của tiến trình con
+        stats["children_cpu_s"] = round(children1 - children0, 4)
+        stats["cpu_s"] = round(cpu + children1 - children0, 4)
+    else:
+        stats["cpu_s"] = round(cpu, 4)
+    stats["py_peak_mb"] = round(peak / (1024 * 1024), 2)
+    return result, stats
+
+def bench_find_highlight(audio_path: str, duration: int, events: list[int], clip_duration: int, num_clips: int) -> dict:
+    points, stats = _measure(lambda: ai.find_highlight(audio_path, clip_duration, num_clips))
+    starts = [ai.hms_to_sec(s) for s, _ in points]
+    hits = sum(1 for e in events if any(s <= e < s + clip_duration for s in starts))
+    stats.update({
+        "audio_s": duration,
+        "realtime_x": round(duration / stats["wall_s"], 1) if stats["wall_s"] else None,
+        "events_found": hits,
+        "events_total": len(events),
+    })
+    return stats
+
+def bench_plan_highlights(audio_path: str, durations: tuple[int, ...], num_clips: int) -> dict:
+    y, sr = ai.load_audio(audio_path)
+    envelope = ai.rms_envelope(y, sr)
+    del y
+    moments, stats = _measure(lambda: ai.plan_highlights(envelope, durations, num_clips))
+    # Các khoảnh khắc không bao giờ được trùng hoặc chồng lấn nhau
+    spans = sorted((m.start, m.start + m.duration) for m in moments)
+    if any(b[0] < a[1] for a, b in zip(spans, spans[1:])):
+        raise RuntimeError(f"plan_highlights trả về khoảnh khắc chồng lấn: {spans}")
+    stats.update({"envelope_s": int(len(envelope)), "durations": list(durations), "moments": len(moments)})
+    return stats
+
+def _make_worker(ffmpeg_dir: str, out_dir: str, aspect_ratios: tuple[str, ...]) -> "ai.HighlightWorker":
+    cfg = ai.JobConfig(
+        url="", clip_durations=(30,), ffmpeg_path=ffmpeg_dir, cookies_path=None,
+        output_path=out_dir, quality="720p", num_clips=1, aspect_ratios=aspect_ratios,
+    )
+    return ai.HighlightWorker(cfg)
+
+def bench_cut(ffmpeg_dir: str, video_path: str, duration: int, out_dir: str, aspect_ratios: tuple[str, ...],
+              clip_duration: int, key: str) -> dict:
+    worker = _make_worker(ffmpeg_dir, out_dir, aspect_ratios)
+    start = max(0, duration // 2 - clip_duration // 2)
+    outputs = [ai.ClipOutput(a, os.path.join(out_dir, f"cut_{duration}s_{key}{ai.ASPECT_SUFFIXES[a]}.mp4"))
+               for a in aspect_ratios]
+    _, stats = _measure(lambda: worker._cut_with_ffmpeg(video_path, outputs, ai.sec_to_time(start), clip_duration))
+    stats["clip_s"] = clip_duration
+    stats["renditions"] = len(outputs)
+    return stats
+
+def bench_thumbnail(ffmpeg_dir: str, clip_path: str, repeats: int = 5) -> dict:
+    thumb_path = ai.thumbnail_path(clip_path)
+    walls = []
+    for _ in range(repeats):
+        if os.path.exists(thumb_path):
+            os.remove(thumb_path)
+        t0 = time.perf_counter()
+        ai.VideoItemWidget(clip_path, ffmpeg_dir).deleteLater()
+        walls.append(time.perf_counter() - t0)
+    return {"repeats": repeats, "wall_s_mean": round(sum(walls) / len(walls), 4), "wall_s_max": round(max(walls), 4)}
+
+def _populate_library(lib_dir: str, clip_path: str, count: int, with_thumbs: bool):
+    shutil.rmtree(lib_dir, ignore_errors=True)
+    os.makedirs(os.path.join(lib_dir, "thumbs"))
+    src_thumb = ai.thumbnail_path(clip_path)
+    src_info = ai.clip_info_path(clip_path)
+    for i in range(count):
+        name = f"bench_{i:05d}_highlight_1.mp4"
+        dst = os.path.join(lib_dir, name)
+        try:
+            os.link(clip_path, dst)
+        except OSError:
+            shutil.copyfile(clip_path, dst)
+        if with_thumbs and os.path.exists(src_thumb):
+            shutil.copyfile(src_thumb, ai.thumbnail_path(dst))
+        if with_thumbs and os.path.exists(src_info):
+            shutil.copyfile(src_info, ai.clip_info_path(dst))
+
+def bench_library(app, ffmpeg_dir: str, lib_dir: str, clip_path: str, count: int, with_thumbs: bool, view_mode: str) -> dict:
+    _populate_library(lib_dir, clip_path, count, with_thumbs)
+    library = ai.VideoLibraryWidget(lib_dir, ffmpeg_dir)
+    library.resize(1200, 800)
+    library.current_view_mode = view_mode
+    _, stats = _measure(library.refresh_list)
+    app.processEvents()
+    library.deleteLater()
+    stats.update({"files": count, "thumbs_cached": with_thumbs, "view_mode": view_mode})
+    return stats
+
+# ==========================
+# Lưu & so sánh kết quả
+# ==========================
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+def save_results(results_dir: str, results: dict) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{results['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+def _flatten(results: dict) -> dict:
+    flat = {}
+    for name, stats in results.get("benchmarks", {}).items():
+        wall = stats.get("wall_s", stats.get("wall_s_mean"))
+        if wall is not None:
+            flat[name] = wall
+    return flat
+
+def compare(results_dir: str):
+    files = sorted(glob.glob(os.path.join(results_dir, "*.json")))
+    if len(files) < 2:
+        print("Cần ít nhất 2 lần chạy để so sánh.")
+        return
+    with open(files[-2], encoding="utf-8") as f:
+        old = json.load(f)
+    with open(files[-1], encoding="utf-8") as f:
+        new = json.load(f)
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    print(f"{'benchmark':<40} {old['commit']:>10} {new['commit']:>10} {'tỷ lệ':>8}")
+    for name in sorted(set(old_flat) | set(new_flat)):
+        a, b = old_flat.get(name), new_flat.get(name)
+        ratio = f"{b / a:.2f}x" if a and b else "-"
+        print(f"{name:<40} {a if a is not None else '-':>10} {b if b is not None else '-':>10} {ratio:>8}")
+
+# ==========================
+# Entry
+# ==========================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline cho YouTube Highlight Maker")
+    parser.add_argument("--ffmpeg", default="", help="Thư mục chứa ffmpeg.exe/ffprobe.exe (mặc định: lấy từ config.ini/PATH)")
+    parser.add_argument("--durations", default="60,600", help="Độ dài media tổng hợp, giây, phân tách bằng dấu phẩy")
+    parser.add_argument("--video-size", default="640x360")
+    parser.add_argument("--clip-duration", type=int, default=30)
+    parser.add_argument("--num-clips", type=int, default=3)
+    parser.add_argument("--library-files", type=int, default=2000)
+    parser.add_argument("--library-cold", action="store_true", help="Đo thêm refresh_list khi chưa có thumbnail (rất chậm)")
+    parser.add_argument("--skip-video", action="store_true", help="Chỉ đo find_highlight")
+    parser.add_argument("--workdir", default="bench_media")
+    parser.add_argument("--results-dir", default="bench_results")
+    parser.add_argument("--compare", action="store_true", help="So sánh hai lần chạy gần nhất rồi thoát")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.results_dir)
+        return
+
+    ffmpeg_path = args.ffmpeg or ai.find_ffmpeg_in_path() or ai.load_config()[0]
+    if not ffmpeg_path:
+        sys.exit("Không tìm thấy ffmpeg. Dùng --ffmpeg để chỉ định.")
+    ffmpeg_dir = os.path.dirname(ffmpeg_path) if ffmpeg_path.lower().endswith("ffmpeg.exe") else ffmpeg_path
+
+    app = ai.QApplication.instance() or ai.QApplication(sys.argv)
+    os.makedirs(args.workdir, exist_ok=True)
+    out_dir = os.path.join(args.workdir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+
+    results = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "benchmarks": {},
+    }
+    benchmarks = results["benchmarks"]
+
+    durations = [int(d) for d in args.durations.split(",") if d.strip()]
+    sample_clip = None
+    for duration in durations:
+        events = _event_times(duration, max(1, args.num_clips), seed=duration)
+
+        audio_path = os.path.join(args.workdir, f"synthetic_{duration}s.wav")
+        print(f"[{duration}s] Tạo audio tổng hợp...")
+        make_audio(ffmpeg_dir, audio_path, duration, events)
+        benchmarks[f"find_highlight/{duration}s"] = bench_find_highlight(
+            audio_path, duration, events, args.clip_duration, args.num_clips)
+        print(f"  find_highlight: {benchmarks[f'find_highlight/{duration}s']}")
+        benchmarks[f"plan_highlights/{duration}s"] = bench_plan_highlights(audio_path, (15, 30, 60), args.num_clips)
+        print(f"  plan_highlights: {benchmarks[f'plan_highlights/{duration}s']}")
+
+        if args.skip_video:
+            continue
+
+        video_path = os.path.join(args.workdir, f"synthetic_{duration}s_{args.video_size}.mp4")
+        print(f"[{duration}s] Tạo video tổng hợp...")
+        make_video(ffmpeg_dir, video_path, duration, events, args.video_size)
+        clip_duration = min(args.clip_duration, duration)
+        for aspect_ratios, key in ((("Gốc",), "copy"), (("Dọc 9:16 (Cắt)",), "916_crop"), (ai.ASPECT_RATIOS, "all")):
+            name = f"cut_{key}/{duration}s"
+            benchmarks[name] = bench_cut(ffmpeg_dir, video_path, duration, out_dir, aspect_ratios, clip_duration, key)
+            print(f"  {name}: {benchmarks[name]}")
+        sample_clip = sample_clip or os.path.join(out_dir, f"cut_{duration}s_copy.mp4")
+
+    if sample_clip and os.path.exists(sample_clip):
+        benchmarks["thumbnail"] = bench_thumbnail(ffmpeg_dir, sample_clip)
+        print(f"  thumbnail: {benchmarks['thumbnail']}")
+
+        lib_dir = os.path.join(args.workdir, "library")
+        for view_mode in ("grid", "list"):
+            name = f"refresh_list/{view_mode}/{args.library_files}"
+            benchmarks[name] = bench_library(app, ffmpeg_dir, lib_dir, sample_clip, args.library_files, True, view_mode)
+            print(f"  {name}: {benchmarks[name]}")
+        if args.library_cold:
+            name = f"refresh_list/grid_cold/{args.library_files}"
+            benchmarks[name] = bench_library(app, ffmpeg_dir, lib_dir, sample_clip, args.library_files, False, "grid")
+            print(f"  {name}: {benchmarks[name]}")
+
+    print(f"Đã lưu kết quả: {save_results(args.results_dir, results)}")
+
+if __name__ == "__main__":
+    main()